@@ -8,10 +8,16 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 from src.core.config import settings
 from src.core.db import BaseORM
+from src.jobs.models import Job  # noqa
 from src.users.models import User  # noqa
 
 config = context.config
-config.set_main_option("sqlalchemy.url", settings.SQLALCHEMY_DATABASE_URI)
+# Shards are migrated one by one with `alembic -x shard=<index> upgrade head`.
+shard = context.get_x_argument(as_dictionary=True).get("shard")
+config.set_main_option(
+    "sqlalchemy.url",
+    settings.POSTGRES_SHARD_URIS[int(shard)] if shard else settings.SQLALCHEMY_DATABASE_URI,
+)
 
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
@@ -45,7 +51,13 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # Each revision commits on its own, so that online helpers from src.core.migrations
+    # can run parts of a revision outside of its transaction.
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        transaction_per_migration=True,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
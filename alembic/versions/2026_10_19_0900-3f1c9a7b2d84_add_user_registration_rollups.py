@@ -0,0 +1,165 @@
+"""add user registration rollups
+
+Revision ID: 3f1c9a7b2d84
+Revises: 9566da4d93a6
+Create Date: 2026-10-19 09:00:12.318406
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.core.migrations import (
+    create_index_concurrently,
+    drop_index_concurrently,
+    execute_in_batches,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c9a7b2d84"
+down_revision: Union[str, None] = "9566da4d93a6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Statement-level triggers count every insert, update and delete of users in one upsert
+# per statement, including bulk and manual writes. The same SQL is in src/users/models.py.
+ROLLUPS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION update_user_registration_rollups() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            UPDATE user_registration_rollups AS rollups
+            SET registrations = rollups.registrations - deleted.registrations
+            FROM (
+                SELECT date_trunc('hour', registration) AS bucket, count(*) AS registrations
+                FROM {old_users}
+                GROUP BY 1
+            ) AS deleted
+            WHERE rollups.bucket = deleted.bucket;
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO user_registration_rollups (bucket, registrations)
+            SELECT date_trunc('hour', registration), count(*)
+            FROM {new_users}
+            GROUP BY 1
+            ON CONFLICT (bucket) DO UPDATE
+            SET registrations = user_registration_rollups.registrations + excluded.registrations;
+        ELSE
+            INSERT INTO user_registration_rollups (bucket, registrations)
+            SELECT bucket, sum(delta)
+            FROM (
+                SELECT date_trunc('hour', registration) AS bucket, 1 AS delta FROM {new_users}
+                UNION ALL
+                SELECT date_trunc('hour', registration), -1 FROM {old_users}
+            ) AS changes
+            GROUP BY bucket
+            HAVING sum(delta) <> 0
+            ON CONFLICT (bucket) DO UPDATE
+            SET registrations = user_registration_rollups.registrations + excluded.registrations;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+# While the backfill runs, the triggers leave out the users it has not counted yet,
+# so deleting one of them does not subtract a registration that was never added.
+BACKFILL_COUNTED = (
+    "id < (SELECT next_id FROM user_registration_rollups_backfill) "
+    "OR id > (SELECT last_id FROM user_registration_rollups_backfill)"
+)
+ROLLUP_TRIGGERS = [
+    "CREATE OR REPLACE TRIGGER users_registration_rollups_insert AFTER INSERT ON users "
+    "REFERENCING NEW TABLE AS new_users "
+    "FOR EACH STATEMENT EXECUTE FUNCTION update_user_registration_rollups()",
+    "CREATE OR REPLACE TRIGGER users_registration_rollups_update AFTER UPDATE ON users "
+    "REFERENCING OLD TABLE AS old_users NEW TABLE AS new_users "
+    "FOR EACH STATEMENT EXECUTE FUNCTION update_user_registration_rollups()",
+    "CREATE OR REPLACE TRIGGER users_registration_rollups_delete AFTER DELETE ON users "
+    "REFERENCING OLD TABLE AS old_users "
+    "FOR EACH STATEMENT EXECUTE FUNCTION update_user_registration_rollups()",
+]
+
+
+def upgrade() -> None:
+    # The batches commit the statements before them, so those are run again when
+    # an interrupted run is resumed.
+    op.create_table(
+        "user_registration_rollups",
+        sa.Column("bucket", sa.DateTime(), nullable=False),
+        sa.Column("registrations", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("bucket"),
+        if_not_exists=True,
+    )
+    # The ids of the users still to count, from next_id to last_id. A batch moves next_id
+    # in the statement adding its counts, so a resumed run never counts a user twice.
+    op.create_table(
+        "user_registration_rollups_backfill",
+        sa.Column("next_id", sa.BigInteger(), nullable=False),
+        sa.Column("last_id", sa.BigInteger(), nullable=False),
+        if_not_exists=True,
+    )
+    op.execute(
+        ROLLUPS_FUNCTION.format(
+            old_users=f"(SELECT * FROM old_users WHERE {BACKFILL_COUNTED}) AS old_users",
+            new_users=f"(SELECT * FROM new_users WHERE {BACKFILL_COUNTED}) AS new_users",
+        )
+    )
+    for trigger in ROLLUP_TRIGGERS:
+        op.execute(trigger)
+    # Creating the triggers waits for the writes in flight, so every user above the last id
+    # read in the same transaction is counted by the triggers, the others by the backfill.
+    op.execute(
+        """
+        INSERT INTO user_registration_rollups_backfill (next_id, last_id)
+        SELECT coalesce(min(id), 0), coalesce(max(id), 0)
+        FROM users
+        HAVING NOT EXISTS (SELECT 1 FROM user_registration_rollups_backfill)
+        """
+    )
+    # Buckets spanning several batches add up their counts. The users of a batch are locked,
+    # so one deleted before the batch is counted by neither, and one deleted after it
+    # is added by the batch and subtracted by the triggers.
+    execute_in_batches(
+        "users",
+        """
+        WITH progress AS (
+            UPDATE user_registration_rollups_backfill SET next_id = :end RETURNING last_id
+        )
+        INSERT INTO user_registration_rollups (bucket, registrations)
+        SELECT date_trunc('hour', registration), count(*)
+        FROM (
+            SELECT registration
+            FROM users
+            WHERE id >= :start AND id < :end AND id <= (SELECT last_id FROM progress)
+            FOR SHARE
+        ) AS batch
+        GROUP BY 1
+        ON CONFLICT (bucket) DO UPDATE
+        SET registrations = user_registration_rollups.registrations + excluded.registrations
+        """,
+        pending=(
+            "id >= (SELECT next_id FROM user_registration_rollups_backfill) "
+            "AND id <= (SELECT last_id FROM user_registration_rollups_backfill)"
+        ),
+    )
+    create_index_concurrently("ix_users_registration", "users", ["registration"])
+    # The revision is stamped in the transaction dropping the progress, so a run interrupted
+    # before never starts the backfill over.
+    op.execute(ROLLUPS_FUNCTION.format(old_users="old_users", new_users="new_users"))
+    op.drop_table("user_registration_rollups_backfill")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER users_registration_rollups_delete ON users")
+    op.execute("DROP TRIGGER users_registration_rollups_update ON users")
+    op.execute("DROP TRIGGER users_registration_rollups_insert ON users")
+    op.execute("DROP FUNCTION update_user_registration_rollups()")
+    op.drop_table("user_registration_rollups_backfill", if_exists=True)
+    op.drop_table("user_registration_rollups")
+    drop_index_concurrently("ix_users_registration", "users")
@@ -0,0 +1,73 @@
+"""add user change feed
+
+Revision ID: c5d8e2f6a013
+Revises: a72e5d0c41f9
+Create Date: 2026-10-19 12:15:33.580271
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.core.migrations import (
+    backfill_in_batches,
+    create_index_concurrently,
+    drop_index_concurrently,
+    set_not_null,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c5d8e2f6a013"
+down_revision: Union[str, None] = "a72e5d0c41f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The backfill commits the statements before it, so those are skipped when
+    # an interrupted run is resumed.
+    op.execute(sa.schema.CreateSequence(sa.Sequence("user_change_seq"), if_not_exists=True))
+    op.execute(
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE "
+        "DEFAULT now() NOT NULL"
+    )
+    # A volatile default would rewrite the table under an exclusive lock, so the column
+    # is added empty, gets its default for new rows, and existing rows are backfilled.
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS change_seq BIGINT")
+    op.alter_column("users", "change_seq", server_default=sa.text("nextval('user_change_seq')"))
+    op.create_table(
+        "user_tombstones",
+        sa.Column(
+            "change_seq",
+            sa.BigInteger(),
+            server_default=sa.text("nextval('user_change_seq')"),
+            nullable=False,
+        ),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "deleted_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("change_seq"),
+        if_not_exists=True,
+    )
+    backfill_in_batches(
+        "users",
+        set_clause="change_seq = nextval('user_change_seq')",
+        pending="change_seq IS NULL",
+    )
+    set_not_null("users", "change_seq")
+    create_index_concurrently("ix_users_change_seq", "users", ["change_seq"])
+
+
+def downgrade() -> None:
+    op.drop_table("user_tombstones")
+    drop_index_concurrently("ix_users_change_seq", "users")
+    op.drop_column("users", "change_seq")
+    op.drop_column("users", "updated_at")
+    op.execute(sa.schema.DropSequence(sa.Sequence("user_change_seq")))
@@ -0,0 +1,100 @@
+"""position user changes by transaction
+
+Revision ID: 5a9c2e7d1f48
+Revises: 7b4e1d9a2c60
+Create Date: 2026-10-19 18:00:41.208357
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5a9c2e7d1f48"
+down_revision: Union[str, None] = "7b4e1d9a2c60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Positions start with the id of the writing transaction shifted left by 20 bits,
+    # so they stay above the positions taken from user_change_seq so far.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION user_change_position() RETURNS bigint
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            counter integer := coalesce(
+                nullif(current_setting('users.change_counter', true), ''), '0'
+            )::integer + 1;
+        BEGIN
+            IF counter >= (1 << 20) THEN
+                RAISE EXCEPTION 'Too many user changes in one transaction';
+            END IF;
+            PERFORM set_config('users.change_counter', counter::text, true);
+            RETURN (pg_current_xact_id()::text::bigint << 20) | counter;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION set_user_change_seq() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.change_seq := user_change_position();
+            RETURN NEW;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION record_user_tombstones() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO user_tombstones (change_seq, user_id)
+            SELECT user_change_position(), id FROM old_users;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER users_change_seq BEFORE INSERT OR UPDATE ON users "
+        "FOR EACH ROW EXECUTE FUNCTION set_user_change_seq()"
+    )
+    op.execute(
+        "CREATE TRIGGER users_tombstones AFTER DELETE ON users "
+        "REFERENCING OLD TABLE AS old_users "
+        "FOR EACH STATEMENT EXECUTE FUNCTION record_user_tombstones()"
+    )
+    op.alter_column("users", "change_seq", server_default=None)
+    op.alter_column("user_tombstones", "change_seq", server_default=None)
+    op.execute(sa.schema.DropSequence(sa.Sequence("user_change_seq")))
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence("user_change_seq")))
+    # The sequence continues after the last position, so cursors held by consumers stay valid.
+    op.execute(
+        """
+        SELECT setval('user_change_seq', greatest(
+            (SELECT coalesce(max(change_seq), 0) FROM users),
+            (SELECT coalesce(max(change_seq), 0) FROM user_tombstones),
+            1
+        ))
+        """
+    )
+    op.alter_column(
+        "user_tombstones", "change_seq", server_default=sa.text("nextval('user_change_seq')")
+    )
+    op.alter_column("users", "change_seq", server_default=sa.text("nextval('user_change_seq')"))
+    op.execute("DROP TRIGGER users_tombstones ON users")
+    op.execute("DROP TRIGGER users_change_seq ON users")
+    op.execute("DROP FUNCTION record_user_tombstones()")
+    op.execute("DROP FUNCTION set_user_change_seq()")
+    op.execute("DROP FUNCTION user_change_position()")
@@ -0,0 +1,220 @@
+import asyncio
+from collections.abc import AsyncIterator, Mapping
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.config import settings
+from src.core.metrics import metrics
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is shed instead of being admitted.
+    """
+
+
+class ConcurrencyLimiter:
+    """
+    A class for bounding the number of requests of a route group run concurrently.
+
+    Requests over the limit wait in a bounded queue, and are shed when the queue
+    is full or they have waited too long.
+
+    Attributes:
+        name (str): The name of the route group, used as a prefix for the collected metrics.
+        limit (int): The number of requests run concurrently.
+        max_queue (int): The number of requests that may wait for admission.
+        max_wait (float): The number of seconds a request may wait for admission.
+    """
+
+    def __init__(self, name: str, *, limit: int, max_queue: int, max_wait: float) -> None:
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(limit)
+        self._waiting = 0
+
+    async def acquire(self) -> None:
+        """
+        Asynchronously waits until the request may run.
+
+        Raises:
+            Overloaded: If the queue is full or the request waited longer than max_wait.
+        """
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queue:
+                self._shed()
+            metrics.inc(f"admission_{self.name}_queued")
+            self._set_waiting(self._waiting + 1)
+            acquiring = asyncio.ensure_future(self._semaphore.acquire())
+            try:
+                async with asyncio.timeout(self.max_wait):
+                    await asyncio.shield(acquiring)
+            except BaseException as exc:
+                # The permit may have been granted just as the wait timed out or was cancelled,
+                # it is then given back rather than lost.
+                if acquiring.done() and not acquiring.cancelled():
+                    self._semaphore.release()
+                else:
+                    acquiring.cancel()
+                if isinstance(exc, TimeoutError):
+                    self._shed()
+                raise
+            finally:
+                self._set_waiting(self._waiting - 1)
+        else:
+            await self._semaphore.acquire()
+        metrics.inc(f"admission_{self.name}_admitted")
+        metrics.inc(f"admission_{self.name}_in_flight")
+
+    def release(self) -> None:
+        """
+        Lets the next waiting request run.
+        """
+        metrics.inc(f"admission_{self.name}_in_flight", -1)
+        self._semaphore.release()
+
+    def _set_waiting(self, waiting: int) -> None:
+        self._waiting = waiting
+        metrics.set(f"admission_{self.name}_waiting", waiting)
+
+    def _shed(self) -> None:
+        metrics.inc(f"admission_{self.name}_shed")
+        raise Overloaded(f"Too many concurrent {self.name} requests")
+
+
+# The limiter of the route group of the current request, permits are taken by admitted().
+request_limiter: ContextVar[ConcurrencyLimiter | None] = ContextVar("request_limiter", default=None)
+
+
+@asynccontextmanager
+async def admitted() -> AsyncIterator[None]:
+    """
+    Holds a permit of the route group of the current request while the database work runs.
+
+    Outside a limited request it admits the work right away.
+
+    Raises:
+        Overloaded: If the queue is full or the work waited longer than max_wait.
+    """
+    limiter = request_limiter.get()
+    if limiter is None:
+        yield
+        return
+    await limiter.acquire()
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+def get_route_group(method: str, path: str) -> str | None:
+    """
+    Returns the route group whose budget a request counts against.
+
+    Args:
+        method (str): The HTTP method of the request.
+        path (str): The path of the request.
+
+    Returns:
+        str | None: The name of the route group, or None if the request is not limited.
+    """
+    if not path.startswith("/api/v1/") or path.startswith("/api/v1/metrics/"):
+        return None
+    # Streams are long-lived and poll with short-lived sessions of their own.
+    if path.endswith("/stream/"):
+        return None
+    if path.endswith(("/statistics/", "/registrations/")):
+        return "statistics"
+    if method in ("GET", "HEAD"):
+        return "read"
+    return "write"
+
+
+def overloaded_response(retry_after: int, detail: str) -> JSONResponse:
+    """
+    Builds the response returned to shed requests.
+
+    Args:
+        retry_after (int): The number of seconds after which the client may retry.
+        detail (str): The reason the request was shed.
+
+    Returns:
+        JSONResponse: A 503 Service Unavailable response with a Retry-After header.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": detail},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class AdmissionControlMiddleware:
+    """
+    An ASGI middleware admitting requests within the concurrency budget of their route group,
+    so that one group, such as statistics, cannot starve the others of database connections.
+
+    The permit is taken around the database work of the request, with admitted(), rather
+    than for the whole request, so requests joining an identical call in flight take none.
+    Work that is shed is answered with 503.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        budgets: Mapping[str, int],
+        max_queue: int,
+        max_wait: float,
+        retry_after: int,
+    ) -> None:
+        self.app = app
+        self.retry_after = retry_after
+        self.limiters = {
+            name: ConcurrencyLimiter(name, limit=limit, max_queue=max_queue, max_wait=max_wait)
+            for name, limit in budgets.items()
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        group = get_route_group(scope["method"], scope["path"])
+        limiter = self.limiters.get(group) if group is not None else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        token = request_limiter.set(limiter)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Overloaded as exc:
+            if response_started:
+                raise
+            response = overloaded_response(self.retry_after, str(exc))
+            await response(scope, receive, send)
+        finally:
+            request_limiter.reset(token)
+
+
+async def pool_timeout_handler(request: Request, exc: Exception) -> JSONResponse:
+    """
+    Sheds requests that waited longer than the pool timeout for a database connection.
+    """
+    metrics.inc("admission_pool_timeout_shed")
+    return overloaded_response(
+        settings.ADMISSION_RETRY_AFTER_SECONDS, "Timed out waiting for a database connection"
+    )
@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class TTLCache(Generic[T]):
+    """
+    A class for an in-process cache whose entries expire after a fixed time.
+
+    When the cache is full, the least recently stored entry is evicted.
+
+    Attributes:
+        ttl (float): The number of seconds an entry stays valid.
+        max_size (int): The maximum number of entries.
+    """
+
+    def __init__(self, *, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[float, T]] = OrderedDict()
+
+    def get(self, key: Hashable) -> T | None:
+        """
+        Returns the value stored for the key if it has not expired.
+
+        Args:
+            key (Hashable): The key of the entry.
+
+        Returns:
+            T | None: The stored value, or None if it is missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+
+    def set(self, key: Hashable, value: T) -> None:
+        """
+        Stores the value for the key.
+
+        Args:
+            key (Hashable): The key of the entry.
+            value (T): The value to store.
+        """
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes all entries.
+        """
+        self._entries.clear()
@@ -14,14 +14,55 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
 
+    # The databases users are spread across, as a JSON list of URIs; the database above
+    # then keeps the id sequence and the directory of usernames and emails.
+    POSTGRES_SHARD_URIS: list[str] = []
+
     POSTGRES_TEST_HOST: str = "localhost"
     POSTGRES_TEST_DB: str
     POSTGRES_TEST_USER: str
     POSTGRES_TEST_PASSWORD: str
     POSTGRES_TEST_PORT: int
+    POSTGRES_TEST_SHARD_URIS: list[str] = []
 
     DEBUG: bool = False
 
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 2
+
+    ADMISSION_STATISTICS_CONCURRENCY: int = 4
+    ADMISSION_READ_CONCURRENCY: int = 8
+    ADMISSION_WRITE_CONCURRENCY: int = 4
+    ADMISSION_MAX_QUEUE: int = 32
+    ADMISSION_MAX_WAIT_SECONDS: float = 1
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    DEADLINE_STATISTICS_SECONDS: float = 10
+    DEADLINE_READ_SECONDS: float = 5
+    DEADLINE_WRITE_SECONDS: float = 5
+
+    PROFILING_SECRET: str | None = None
+    PROFILING_SAMPLE_RATE: float = 0
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_PROFILES: int = 100
+
+    APPROX_COUNT_TTL_SECONDS: float = 60
+
+    IDEMPOTENCY_TTL_SECONDS: float = 86400
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+
+    # Concurrent user creates are inserted in batches collected for this long, 0 to disable.
+    USER_CREATE_BATCH_WINDOW_MS: float = 0
+    USER_CREATE_BATCH_MAX_SIZE: int = 100
+
+    JOB_WORKERS: int = 2
+    JOB_POLL_INTERVAL_SECONDS: float = 1
+    JOB_STALE_AFTER_SECONDS: float = 60
+    JOB_MAX_ATTEMPTS: int = 3
+
+    CHANGE_FEED_POLL_INTERVAL_SECONDS: float = 1
+
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
         return (
@@ -6,9 +6,13 @@ from src.core.config import settings
 engine = create_async_engine(
     url=settings.SQLALCHEMY_DATABASE_URI,
     echo=settings.DEBUG,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
 )
 
-async_session_maker = async_sessionmaker(engine, class_=AsyncSession)
+# Objects stay loaded after commit, so they can be serialized after their session is closed.
+async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
 class BaseORM(DeclarativeBase):
@@ -0,0 +1,137 @@
+import asyncio
+import contextlib
+import time
+from collections.abc import Mapping
+from contextvars import ContextVar
+
+from asyncpg.exceptions import QueryCanceledError
+from fastapi import status
+from fastapi.responses import JSONResponse
+from sqlalchemy import Connection, event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, SessionTransaction
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.admission import get_route_group
+from src.core.metrics import metrics
+
+# The time.monotonic() value by which the current request must be answered.
+request_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+@event.listens_for(Session, "after_begin")
+def set_statement_timeout(
+    session: Session, transaction: SessionTransaction, connection: Connection
+) -> None:
+    """
+    Bounds the statements of a transaction begun within a request by the request deadline.
+    """
+    deadline = request_deadline.get()
+    if deadline is None:
+        return
+    timeout_ms = max(1, int((deadline - time.monotonic()) * 1000))
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+def is_query_canceled(exc: DBAPIError) -> bool:
+    """
+    Checks whether a database error reports a statement cancelled by the statement timeout.
+
+    Args:
+        exc (DBAPIError): The error raised by SQLAlchemy.
+
+    Returns:
+        bool: True if the driver raised QueryCanceledError, SQLSTATE 57014.
+    """
+    return exc.orig is not None and isinstance(exc.orig.__cause__, QueryCanceledError)
+
+
+def deadline_exceeded_response() -> JSONResponse:
+    """
+    Builds the response returned to requests that were not answered by their deadline.
+
+    Returns:
+        JSONResponse: A 504 Gateway Timeout response.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={"detail": "The request was not completed within its deadline"},
+    )
+
+
+class DeadlineMiddleware:
+    """
+    An ASGI middleware bounding how long a request of each route group may run.
+
+    The request is cancelled, together with its in-flight query, when the deadline
+    expires or the client disconnects. An expired request is answered with 504, a
+    disconnected one is only counted as a 499 since nobody is left to answer.
+    A query cancelled by the statement timeout derived from the deadline is answered
+    with 504 too, other database errors are left to the application.
+    """
+
+    def __init__(self, app: ASGIApp, *, deadlines: Mapping[str, float]) -> None:
+        self.app = app
+        self.deadlines = deadlines
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        group = get_route_group(scope["method"], scope["path"])
+        timeout = self.deadlines.get(group) if group is not None else None
+        if timeout is None:
+            await self.app(scope, receive, send)
+            return
+
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        disconnected = asyncio.Event()
+        response_started = False
+
+        async def listen_for_disconnect() -> None:
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        async def run_app() -> None:
+            await self.app(scope, messages.get, send_wrapper)
+
+        token = request_deadline.set(time.monotonic() + timeout)
+        listener = asyncio.create_task(listen_for_disconnect())
+        disconnect = asyncio.create_task(disconnected.wait())
+        app_task = asyncio.create_task(run_app())
+        try:
+            done, _ = await asyncio.wait(
+                {app_task, disconnect}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if app_task in done:
+                try:
+                    app_task.result()
+                except DBAPIError as exc:
+                    if response_started or not is_query_canceled(exc):
+                        raise
+                    metrics.inc("deadline_statement_timeout")
+                    await deadline_exceeded_response()(scope, receive, send)
+                return
+            app_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await app_task
+            if disconnect in done:
+                metrics.inc(f"deadline_{group}_client_disconnected")
+                return
+            metrics.inc(f"deadline_{group}_exceeded")
+            if not response_started:
+                await deadline_exceeded_response()(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
+            listener.cancel()
+            disconnect.cancel()
@@ -0,0 +1,122 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+from src.core.cache import TTLCache
+from src.core.deadlines import request_deadline
+from src.core.metrics import metrics
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    """
+    A class for the response of a request, replayed for retries with the same idempotency key.
+
+    Attributes:
+        status_code (int): The status code of the response.
+        content (Any): The JSON content of the response.
+        headers (dict[str, str]): The headers of the response.
+    """
+
+    status_code: int
+    content: Any
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+class IdempotencyStore:
+    """
+    A class for running a request once per idempotency key.
+
+    The first response of a key, successful or a client error, is stored for a limited time
+    and returned to retries. Retries arriving while the request is in flight wait for it.
+    The request runs in a task of its own, so if the client that sent it first goes away,
+    it still completes and its response is stored for the retries. Its statements are not
+    bounded by the deadline of that client's request.
+    Responses are kept in process, so retries must reach the same process to be replayed.
+
+    Attributes:
+        name (str): The name used as a prefix for the collected metrics.
+    """
+
+    def __init__(self, name: str, *, ttl: float, max_size: int) -> None:
+        self.name = name
+        self._responses: TTLCache[tuple[str, StoredResponse]] = TTLCache(ttl=ttl, max_size=max_size)
+        self._tasks: dict[str, asyncio.Task[tuple[str, StoredResponse]]] = {}
+
+    async def run(
+        self, key: str, fingerprint: str, fn: Callable[[], Awaitable[StoredResponse]]
+    ) -> JSONResponse:
+        """
+        Asynchronously runs the request for the key, or replays its stored response.
+
+        Server errors are not stored, so the request can be retried. As the request may
+        outlive the caller, fn must not use resources scoped to the caller's request,
+        such as its database session.
+
+        Args:
+            key (str): The idempotency key sent by the client.
+            fingerprint (str): The fingerprint of the request body, to detect reused keys.
+            fn (Callable[[], Awaitable[StoredResponse]]): The request to run if it has not run yet.
+
+        Returns:
+            JSONResponse: The response, with the Idempotent-Replayed header on replays.
+
+        Raises:
+            HTTPException: If the key was used with a different request body,
+            a 422 Unprocessable Entity exception is raised.
+        """
+        executed = False
+        stored = self._responses.get(key)
+        if stored is None:
+            task = self._tasks.get(key)
+            if task is None:
+                executed = True
+                metrics.inc(f"{self.name}_executed")
+                task = asyncio.create_task(self._run_once(key, fingerprint, fn))
+                self._tasks[key] = task
+                task.add_done_callback(partial(self._forget, key))
+            else:
+                metrics.inc(f"{self.name}_coalesced")
+            stored = await asyncio.shield(task)
+
+        stored_fingerprint, response = stored
+        if stored_fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="The Idempotency-Key was already used with a different request body",
+            )
+        headers = dict(response.headers)
+        if not executed:
+            metrics.inc(f"{self.name}_replayed")
+            headers["Idempotent-Replayed"] = "true"
+        return JSONResponse(response.content, status_code=response.status_code, headers=headers)
+
+    async def _run_once(
+        self, key: str, fingerprint: str, fn: Callable[[], Awaitable[StoredResponse]]
+    ) -> tuple[str, StoredResponse]:
+        request_deadline.set(None)
+        try:
+            response = await fn()
+        except HTTPException as exc:
+            if exc.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+                raise
+            response = StoredResponse(
+                status_code=exc.status_code,
+                content={"detail": exc.detail},
+                headers=dict(exc.headers or {}),
+            )
+        stored = (fingerprint, response)
+        self._responses.set(key, stored)
+        return stored
+
+    def _forget(self, key: str, task: asyncio.Task[tuple[str, StoredResponse]]) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the exception as retrieved, every caller may have gone away.
+        if not task.cancelled():
+            task.exception()
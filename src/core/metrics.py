@@ -0,0 +1,44 @@
+from collections import defaultdict
+
+
+class Metrics:
+    """
+    A class for collecting in-process counters and gauges.
+
+    Values are kept per worker process and exposed by the metrics endpoint.
+    """
+
+    def __init__(self) -> None:
+        self._values: defaultdict[str, int] = defaultdict(int)
+
+    def inc(self, name: str, value: int = 1) -> None:
+        """
+        Increments the metric with the given name.
+
+        Args:
+            name (str): The name of the metric.
+            value (int): The value to add to the metric.
+        """
+        self._values[name] += value
+
+    def set(self, name: str, value: int) -> None:
+        """
+        Sets the metric with the given name to the given value.
+
+        Args:
+            name (str): The name of the metric.
+            value (int): The new value of the metric.
+        """
+        self._values[name] = value
+
+    def snapshot(self) -> dict[str, int]:
+        """
+        Returns a copy of all collected metrics.
+
+        Returns:
+            dict[str, int]: A mapping of metric names to their current values.
+        """
+        return dict(sorted(self._values.items()))
+
+
+metrics = Metrics()
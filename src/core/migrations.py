@@ -0,0 +1,165 @@
+"""
+Helpers for Alembic revisions that change large tables without blocking the application.
+
+Every helper runs in an autocommit block, outside the transaction of the revision,
+so the revisions using them must not rely on being rolled back as a whole. The block
+commits the statements of the revision run before it, and an interrupted revision is
+not stamped, so those statements must be safe to run again, for example with IF NOT EXISTS.
+"""
+
+import logging
+import time
+
+import sqlalchemy as sa
+
+from alembic import op
+
+logger = logging.getLogger(__name__)
+
+
+def create_index_concurrently(
+    index_name: str, table_name: str, columns: list[str], *, unique: bool = False
+) -> None:
+    """
+    Builds an index with CREATE INDEX CONCURRENTLY, without blocking writes to the table.
+
+    A build interrupted by a failure leaves an invalid index behind, which is dropped
+    first so that the revision can be run again.
+
+    Args:
+        index_name (str): The name of the index.
+        table_name (str): The name of the table.
+        columns (list[str]): The columns of the index.
+        unique (bool): Whether the index is unique.
+    """
+    with op.get_context().autocommit_block():
+        op.execute(
+            sa.text(
+                "DO $$ BEGIN "
+                "IF EXISTS (SELECT 1 FROM pg_index "
+                f"WHERE indexrelid = to_regclass('{index_name}') AND NOT indisvalid) "
+                f"THEN DROP INDEX {index_name}; END IF; END $$"
+            )
+        )
+        op.create_index(
+            index_name,
+            table_name,
+            columns,
+            unique=unique,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    """
+    Drops an index with DROP INDEX CONCURRENTLY, without blocking writes to the table.
+
+    Args:
+        index_name (str): The name of the index.
+        table_name (str): The name of the table.
+    """
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True
+        )
+
+
+def execute_in_batches(
+    table_name: str,
+    statement: str,
+    *,
+    pending: str = "true",
+    batch_size: int = 10_000,
+    pause: float = 0.1,
+) -> None:
+    """
+    Executes a statement once per id range of a table, each batch in a transaction of its own.
+
+    The ranges cover the ids of the rows matching the pending condition when the batches start,
+    and are passed to the statement as the :start (inclusive) and :end (exclusive) parameters.
+
+    Args:
+        table_name (str): The name of the table, with a numeric id primary key.
+        statement (str): The SQL statement to execute for each range of ids.
+        pending (str): The SQL condition of the rows still to process.
+        batch_size (int): The width of the id range processed per batch.
+        pause (float): The number of seconds to sleep between batches, to throttle the load.
+    """
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        first_id, last_id = bind.execute(
+            sa.text(f"SELECT min(id), max(id) FROM {table_name} WHERE {pending}")
+        ).one()
+        if first_id is None:
+            logger.info("Batches over %s: nothing to do", table_name)
+            return
+
+        processed = 0
+        for start in range(first_id, last_id + 1, batch_size):
+            result = bind.execute(sa.text(statement), {"start": start, "end": start + batch_size})
+            processed += result.rowcount
+            done = min(start + batch_size, last_id + 1) - first_id
+            logger.info(
+                "Batches over %s: %d rows processed, %.1f%% of ids %d..%d",
+                table_name,
+                processed,
+                done * 100 / (last_id + 1 - first_id),
+                first_id,
+                last_id,
+            )
+            time.sleep(pause)
+
+
+def backfill_in_batches(
+    table_name: str,
+    *,
+    set_clause: str,
+    pending: str,
+    batch_size: int = 10_000,
+    pause: float = 0.1,
+) -> None:
+    """
+    Updates the rows of a table in batches by id range, each batch in a transaction of its own.
+
+    Only rows matching the pending condition are updated, and the condition must no longer
+    hold once a row is updated, so an interrupted backfill resumes where it stopped.
+
+    Args:
+        table_name (str): The name of the table, with a numeric id primary key.
+        set_clause (str): The SQL SET clause, for example "change_seq = nextval('seq')".
+        pending (str): The SQL condition of the rows still to update, for example
+            "change_seq IS NULL".
+        batch_size (int): The width of the id range updated per batch.
+        pause (float): The number of seconds to sleep between batches, to throttle the load.
+    """
+    execute_in_batches(
+        table_name,
+        f"UPDATE {table_name} SET {set_clause} WHERE id >= :start AND id < :end AND ({pending})",
+        pending=pending,
+        batch_size=batch_size,
+        pause=pause,
+    )
+
+
+def set_not_null(table_name: str, column_name: str) -> None:
+    """
+    Sets a column NOT NULL without holding an exclusive lock during the table scan.
+
+    The scan is done by validating a NOT VALID check constraint, which lets Postgres
+    skip it when setting NOT NULL.
+
+    Args:
+        table_name (str): The name of the table.
+        column_name (str): The name of the column, which must no longer contain nulls.
+    """
+    constraint_name = f"ck_{table_name}_{column_name}_not_null"
+    with op.get_context().autocommit_block():
+        op.execute(f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {constraint_name}")
+        op.execute(
+            f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint_name} "
+            f"CHECK ({column_name} IS NOT NULL) NOT VALID"
+        )
+        op.execute(f"ALTER TABLE {table_name} VALIDATE CONSTRAINT {constraint_name}")
+        op.execute(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET NOT NULL")
+        op.execute(f"ALTER TABLE {table_name} DROP CONSTRAINT {constraint_name}")
@@ -0,0 +1,251 @@
+import asyncio
+import cProfile
+import hmac
+import json
+import random
+import time
+import uuid
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Connection, Engine, event
+from sqlalchemy.engine.interfaces import DBAPICursor, ExecutionContext
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.metrics import metrics
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+# The suffixes of the files stored for a profiled request.
+PROFILE_FILE_SUFFIXES = ("pstats", "speedscope.json", "sql.json")
+# The routes never profiled: downloading a profile sends the secret, and must not store
+# a profile of its own and evict an older one.
+UNPROFILED_PATH_PREFIXES = ("/api/v1/profiles/", "/api/v1/metrics/")
+# Calls shorter than this are left out of speedscope profiles, in seconds.
+SPEEDSCOPE_MIN_DURATION = 1e-6
+
+FunctionLabel = tuple[str, int, str]
+
+# The SQL statements executed by the profiled request, None when it is not profiled.
+profiled_statements: ContextVar[list[dict[str, Any]] | None] = ContextVar(
+    "profiled_statements", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement_timer(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext | None,
+    executemany: bool,
+) -> None:
+    """
+    Records when a statement of a profiled request started.
+    """
+    if profiled_statements.get() is not None:
+        conn.info["profiling_started_at"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_statement(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext | None,
+    executemany: bool,
+) -> None:
+    """
+    Records a statement of a profiled request with its duration.
+    """
+    statements = profiled_statements.get()
+    if statements is None:
+        return
+    started_at = conn.info.pop("profiling_started_at", time.perf_counter())
+    statements.append(
+        {
+            "statement": statement,
+            "duration_ms": round((time.perf_counter() - started_at) * 1000, 3),
+        }
+    )
+
+
+def is_authorized(headers: Headers, secret: str | None) -> bool:
+    """
+    Checks whether the request carries the profiling secret.
+
+    Args:
+        headers (Headers): The headers of the request.
+        secret (str | None): The profiling secret, None if profiling on demand is disabled.
+
+    Returns:
+        bool: True if the X-Profile header matches the secret.
+    """
+    value = headers.get(PROFILE_HEADER)
+    return secret is not None and value is not None and hmac.compare_digest(value, secret)
+
+
+def to_speedscope(profiler: cProfile.Profile, name: str) -> dict[str, Any]:
+    """
+    Converts a cProfile profile to a sampled profile in the speedscope file format.
+
+    cProfile records time per pair of caller and callee rather than whole stacks, so the time
+    of a function called from several places is split between its stacks in proportion,
+    as flame graph tools built on pstats do. Recursive calls are folded into their first frame.
+
+    Args:
+        profiler (cProfile.Profile): The disabled profiler.
+        name (str): The name of the profile.
+
+    Returns:
+        dict[str, Any]: The speedscope document, to be serialized as JSON.
+    """
+    profiler.create_stats()
+    stats = profiler.stats
+    children: dict[FunctionLabel, dict[FunctionLabel, float]] = defaultdict(dict)
+    for function, (*_, callers) in stats.items():
+        for caller, (*_, cumulative) in callers.items():
+            children[caller][function] = cumulative
+    frames: dict[FunctionLabel, int] = {}
+    samples: list[list[int]] = []
+    weights: list[float] = []
+
+    def walk(function: FunctionLabel, duration: float, stack: list[FunctionLabel]) -> None:
+        stack = [*stack, function]
+        total = stats[function][3]
+        scale = duration / total if total else 0
+        self_duration = duration
+        for child, cumulative in children[function].items():
+            child_duration = cumulative * scale
+            if child in stack or child_duration < SPEEDSCOPE_MIN_DURATION:
+                continue
+            self_duration -= child_duration
+            walk(child, child_duration, stack)
+        if self_duration >= SPEEDSCOPE_MIN_DURATION:
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(self_duration)
+
+    for function, (_, _, _, cumulative, callers) in stats.items():
+        if not callers:
+            walk(function, cumulative, [])
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "shared": {
+            "frames": [
+                {"name": function_name, "file": file, "line": line}
+                for file, line, function_name in frames
+            ]
+        },
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+class ProfilingMiddleware:
+    """
+    An ASGI middleware profiling requests that carry the profiling secret in the X-Profile
+    header, and a random sample of the others.
+
+    A profiled request gets a cProfile profile, also converted for speedscope, and the SQL
+    statements it executed with their durations, stored as <id>.pstats, <id>.speedscope.json
+    and <id>.sql.json in the profiling directory, where <id> is returned in the X-Profile-Id
+    header. Only the max_profiles most recent profiles are kept. Profile downloads
+    and metrics are never profiled.
+
+    cProfile records every coroutine run on the event loop while it is enabled, so the profile
+    also contains the work of the requests served concurrently, and only one request is
+    profiled at a time. Requests that are not profiled only pay for a header lookup
+    and a random draw.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        secret: str | None,
+        sample_rate: float,
+        directory: str,
+        max_profiles: int,
+    ) -> None:
+        self.app = app
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self._profiling = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._profiling or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._profiling = True
+        profile_id = uuid.uuid4().hex
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, profile_id)
+            await send(message)
+
+        statements: list[dict[str, Any]] = []
+        token = profiled_statements.set(statements)
+        profiler = cProfile.Profile()
+        started_at = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            duration_ms = round((time.perf_counter() - started_at) * 1000, 3)
+            profiled_statements.reset(token)
+            self._profiling = False
+            metrics.inc("profiling_requests_profiled")
+            summary = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "duration_ms": duration_ms,
+                "statements": statements,
+            }
+            await asyncio.to_thread(self._store, profile_id, profiler, summary)
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if scope["path"].startswith(UNPROFILED_PATH_PREFIXES):
+            return False
+        if is_authorized(Headers(scope=scope), self.secret):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _store(self, profile_id: str, profiler: cProfile.Profile, summary: dict[str, Any]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(self.directory / f"{profile_id}.pstats")
+        speedscope = to_speedscope(profiler, f"{summary['method']} {summary['path']}")
+        (self.directory / f"{profile_id}.speedscope.json").write_text(json.dumps(speedscope))
+        (self.directory / f"{profile_id}.sql.json").write_text(json.dumps(summary, indent=2))
+        self._prune()
+
+    def _prune(self) -> None:
+        # The summary is written last, so its modification time orders complete profiles.
+        stored: list[tuple[float, str]] = []
+        for path in self.directory.glob("*.sql.json"):
+            try:
+                stored.append((path.stat().st_mtime, path.name.removesuffix(".sql.json")))
+            except FileNotFoundError:
+                continue
+        for _, profile_id in sorted(stored)[: max(len(stored) - self.max_profiles, 0)]:
+            for suffix in PROFILE_FILE_SUFFIXES:
+                (self.directory / f"{profile_id}.{suffix}").unlink(missing_ok=True)
@@ -0,0 +1,66 @@
+from enum import StrEnum
+from pathlib import Path as FilePath
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Path, Request, status
+from fastapi.responses import FileResponse
+
+from src.core.config import settings
+from src.core.metrics import metrics
+from src.core.profiling import is_authorized
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+profiles_router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+class ProfileFormat(StrEnum):
+    """
+    An enumeration of the files stored for a profiled request.
+    """
+
+    PSTATS = "pstats"
+    SPEEDSCOPE = "speedscope.json"
+    SQL = "sql.json"
+
+
+@router.get("/", status_code=status.HTTP_200_OK)
+async def get_metrics() -> dict[str, int]:
+    """
+    Retrieves the in-process metrics of the current worker.
+
+    Returns:
+        dict[str, int]: A mapping of metric names to their current values.
+    """
+    return metrics.snapshot()
+
+
+@profiles_router.get("/{profile_id}/{profile_format}", response_class=FileResponse)
+async def get_profile(
+    request: Request,
+    profile_id: Annotated[str, Path(pattern=r"^[0-9a-f]{32}$")],
+    profile_format: ProfileFormat,
+) -> FileResponse:
+    """
+    Downloads a file stored for a profiled request, the X-Profile header must carry
+    the profiling secret.
+
+    Args:
+        request (Request): The request, used to check the profiling secret.
+        profile_id (str): The id returned in the X-Profile-Id header of the profiled request.
+        profile_format (ProfileFormat): The cProfile stats, the profile for speedscope
+            or the SQL statements with timings.
+
+    Returns:
+        FileResponse: The stored file.
+
+    Raises:
+        HTTPException: If the secret is missing or wrong, or the profile does not exist,
+        a 404 Not Found exception is raised.
+    """
+    path = FilePath(settings.PROFILING_DIR) / f"{profile_id}.{profile_format}"
+    if not is_authorized(request.headers, settings.PROFILING_SECRET) or not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile with id: {profile_id} does not exist",
+        )
+    return FileResponse(path, filename=path.name)
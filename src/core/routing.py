@@ -0,0 +1,44 @@
+import functools
+import inspect
+from collections.abc import Callable
+from typing import Any
+
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def release_sessions(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wraps the endpoint so that the database sessions it receives are closed as soon as it returns.
+
+    Closing returns the connection to the pool before the response is validated, serialized
+    and sent, while the returned objects stay loaded.
+
+    Args:
+        endpoint (Callable[..., Any]): The endpoint function.
+
+    Returns:
+        Callable[..., Any]: The wrapped endpoint, with the same signature.
+    """
+    if not inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            for value in kwargs.values():
+                if isinstance(value, AsyncSession):
+                    await value.close()
+
+    return wrapper
+
+
+class SessionReleasingRoute(APIRoute):
+    """
+    A route class releasing the database connection of a request once its endpoint returns.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, release_sessions(endpoint), **kwargs)
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any, TypeVar
+
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from src.core.config import settings
+
+T = TypeVar("T")
+
+
+class ShardSet:
+    """
+    A class for the databases users are spread across by a hash of their id.
+
+    Without configured shards every call falls back to the session it is given,
+    so the same code serves a single database and a sharded one.
+    """
+
+    def __init__(self) -> None:
+        self.engines: list[AsyncEngine] = []
+        self.session_makers: list[async_sessionmaker[AsyncSession]] = []
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether users are spread across shards.
+        """
+        return bool(self.engines)
+
+    def configure(self, uris: list[str], **engine_kwargs: Any) -> None:
+        """
+        Creates an engine per shard, an empty list disables sharding.
+
+        Args:
+            uris (list[str]): The database URIs of the shards, in a fixed order.
+            **engine_kwargs (Any): Keyword arguments passed to create_async_engine.
+        """
+        self.engines = [create_async_engine(uri, **engine_kwargs) for uri in uris]
+        self.session_makers = [
+            async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            for engine in self.engines
+        ]
+
+    async def dispose(self) -> None:
+        """
+        Asynchronously closes the connections of all shards.
+        """
+        await asyncio.gather(*(engine.dispose() for engine in self.engines))
+
+    def shard_for(self, user_id: int) -> int:
+        """
+        Returns the index of the shard storing the user.
+
+        Args:
+            user_id (int): The id of the user.
+
+        Returns:
+            int: The index of the shard.
+        """
+        digest = hashlib.blake2b(user_id.to_bytes(8, "big"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % len(self.engines)
+
+    @asynccontextmanager
+    async def session_at(self, db: AsyncSession, index: int) -> AsyncGenerator[AsyncSession]:
+        """
+        Opens a session on the shard with the given index.
+
+        Args:
+            db (AsyncSession): The session to use when sharding is disabled.
+            index (int): The index of the shard.
+
+        Yields:
+            AsyncSession: A session on the shard.
+        """
+        if not self.enabled:
+            yield db
+            return
+        async with self.session_makers[index]() as session:
+            yield session
+
+    @asynccontextmanager
+    async def session_for(self, db: AsyncSession, user_id: int) -> AsyncGenerator[AsyncSession]:
+        """
+        Opens a session on the shard storing the user.
+
+        Args:
+            db (AsyncSession): The session to use when sharding is disabled.
+            user_id (int): The id of the user.
+
+        Yields:
+            AsyncSession: A session on the shard of the user.
+        """
+        async with self.session_at(db, self.shard_for(user_id) if self.enabled else 0) as session:
+            yield session
+
+    async def gather(self, db: AsyncSession, fn: Callable[[AsyncSession], Awaitable[T]]) -> list[T]:
+        """
+        Asynchronously runs the query function on every shard concurrently.
+
+        Args:
+            db (AsyncSession): The session to use when sharding is disabled.
+            fn (Callable[[AsyncSession], Awaitable[T]]): The query function, called with
+                a session on each shard.
+
+        Returns:
+            list[T]: The results of the query function, one per shard.
+        """
+        if not self.enabled:
+            return [await fn(db)]
+
+        async def run(session_maker: async_sessionmaker[AsyncSession]) -> T:
+            async with session_maker() as session:
+                return await fn(session)
+
+        return list(await asyncio.gather(*(run(maker) for maker in self.session_makers)))
+
+
+shards = ShardSet()
+shards.configure(
+    settings.POSTGRES_SHARD_URIS,
+    echo=settings.DEBUG,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+)
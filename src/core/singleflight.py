@@ -0,0 +1,81 @@
+import asyncio
+import copy
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, TypeVar
+
+from src.core.metrics import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    A class for coalescing identical concurrent calls into one.
+
+    The first caller for a key runs the call, every caller that arrives with the
+    same key while it is in flight waits for it and receives a copy of its result,
+    or the same exception.
+
+    Attributes:
+        name (str): The name used as a prefix for the collected metrics.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Future[Any]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Asynchronously runs the call for the given key or joins the one in flight.
+
+        Args:
+            key (Hashable): The key identifying identical calls.
+            fn (Callable[[], Awaitable[T]]): The call to run if none is in flight.
+
+        Returns:
+            T: The result of the call.
+        """
+        while (future := self._calls.get(key)) is not None:
+            try:
+                result: T = copy.deepcopy(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The caller running the call was cancelled, so one of its waiters takes over.
+                continue
+            finally:
+                if not future.cancelled():
+                    metrics.inc(f"{self.name}_coalesced")
+            return result
+
+        metrics.inc(f"{self.name}_executed")
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved, the call may have had no waiters.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Stops later callers from joining the call in flight for the given key.
+
+        Writers call it once their change is committed, so that reads started after
+        the write do not get a result read before it.
+
+        Args:
+            key (Hashable): The key identifying identical calls.
+        """
+        self._calls.pop(key, None)
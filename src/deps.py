@@ -1,7 +1,10 @@
 from collections.abc import AsyncGenerator
+from typing import Annotated
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from src.core.admission import admitted
 from src.core.db import async_session_maker
 
 
@@ -9,8 +12,46 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Asynchronous generator function to create an AsyncSession for database operations.
 
+    The session checks out a connection on its first query only. Routes built with
+    SessionReleasingRoute close it as soon as the endpoint returns, before the response is sent.
+    The session counts against the concurrency budget of the route group of the request.
+
     Yields:
         AsyncSession: An asynchronous session for database operations.
     """
-    async with async_session_maker() as session:
+    async with admitted(), async_session_maker() as session:
         yield session
+
+
+def get_session_maker() -> async_sessionmaker[AsyncSession]:
+    """
+    Returns the factory of database sessions, for work that outlives a single session,
+    such as streaming responses.
+
+    Returns:
+        async_sessionmaker[AsyncSession]: The factory of asynchronous database sessions.
+    """
+    return async_session_maker
+
+
+def get_if_match_version(if_match: Annotated[str | None, Header()] = None) -> int | None:
+    """
+    Parses the version a client expects to update from the If-Match header.
+
+    Args:
+        if_match (str | None): The If-Match header, an ETag such as "3" or W/"3", or *.
+
+    Returns:
+        int | None: The expected version, or None if any version is accepted.
+
+    Raises:
+        HTTPException: If the header is not a version ETag, a 400 Bad Request exception is raised.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    etag = if_match.strip().removeprefix("W/").strip('"')
+    if not etag.isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid If-Match header: {if_match}"
+        )
+    return int(etag)
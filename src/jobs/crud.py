@@ -0,0 +1,144 @@
+from datetime import timedelta
+from typing import Any
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.jobs.models import Job
+from src.jobs.registry import handlers
+from src.jobs.schemas import JobCreate, JobStatus
+
+
+async def get_job_by_id(*, db: AsyncSession, job_id: int) -> Job:
+    """
+    Asynchronously retrieves a job from the database by its id.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        job_id (int): The id of the job to retrieve.
+
+    Returns:
+        Job: The Job object with the specified id.
+
+    Raises:
+        HTTPException: If the job with the specified id does not exist,
+        a 404 Not Found exception is raised.
+    """
+    job = await db.scalar(select(Job).where(Job.id == job_id))
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Job with id: {job_id} does not exist"
+        )
+    return job
+
+
+async def create_job(*, db: AsyncSession, job_in: JobCreate) -> Job:
+    """
+    Asynchronously submits a new job to be run by the workers.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        job_in (JobCreate): A JobCreate object containing the kind and parameters of the job.
+
+    Returns:
+        Job: The newly created Job object.
+
+    Raises:
+        HTTPException: If the kind of the job is unknown or not available in the current
+        configuration, a 400 Bad Request exception is raised.
+        If the parameters are invalid for the kind, a 422 Unprocessable Entity exception is raised.
+    """
+    handler = handlers.get(job_in.kind)
+    if handler is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown job kind: {job_in.kind}"
+        )
+    if not handler.available():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Jobs of kind {job_in.kind} are not available in this configuration",
+        )
+    try:
+        params = handler.params_model.model_validate(job_in.params)
+    except ValidationError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=exc.errors(include_url=False, include_context=False),
+        )
+    job = Job(kind=job_in.kind, params=params.model_dump(mode="json"))
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def claim_job(*, db: AsyncSession, stale_after: float, max_attempts: int) -> Job | None:
+    """
+    Asynchronously claims the oldest job that is pending or whose worker stopped reporting.
+
+    Rows locked by other workers are skipped, so any number of workers can claim jobs
+    concurrently without picking up the same one. Abandoned jobs that were already picked up
+    max_attempts times, for example because they crash their worker, are failed instead.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        stale_after (float): The number of seconds without a heartbeat after which
+            a running job is considered abandoned.
+        max_attempts (int): The number of times a job is picked up before it is failed.
+
+    Returns:
+        Job | None: The claimed Job object, or None if there is no job to run.
+    """
+    while True:
+        job = await db.scalar(
+            select(Job)
+            .where(
+                or_(
+                    Job.status == JobStatus.PENDING,
+                    and_(
+                        Job.status == JobStatus.RUNNING,
+                        Job.heartbeat_at < func.now() - timedelta(seconds=stale_after),
+                    ),
+                )
+            )
+            .order_by(Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if job is None:
+            return None
+        if job.attempts < max_attempts:
+            break
+        job.status = JobStatus.FAILED
+        job.error = f"Abandoned after {job.attempts} attempts"
+        job.finished_at = func.now()
+        await db.commit()
+    job.status = JobStatus.RUNNING
+    job.attempts += 1
+    job.started_at = job.heartbeat_at = func.now()
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def finish_job(
+    *, db: AsyncSession, job_id: int, result: dict[str, Any] | None = None, error: str | None = None
+) -> None:
+    """
+    Asynchronously stores the outcome of a job.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        job_id (int): The id of the finished job.
+        result (dict[str, Any] | None): The result of the job if it succeeded.
+        error (str | None): The error of the job if it failed.
+    """
+    values: dict[str, Any] = {"finished_at": func.now(), "result": result, "error": error}
+    if error is None:
+        values.update(status=JobStatus.SUCCEEDED, progress=100)
+    else:
+        values.update(status=JobStatus.FAILED)
+    await db.execute(update(Job).where(Job.id == job_id).values(values))
+    await db.commit()
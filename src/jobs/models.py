@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import BigInteger, DateTime, Integer, String, Text, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.db import BaseORM
+from src.jobs.schemas import JobStatus
+
+
+class Job(BaseORM):
+    """
+    Represents a background job in the database.
+
+    Attributes:
+        id (int): The unique identifier for the job.
+        kind (str): The kind of the job, used to find its handler.
+        params (dict[str, Any]): The parameters of the job.
+        status (str): The current state of the job.
+        progress (int): The completed share of the job, in percent.
+        result (dict[str, Any] | None): The result of a succeeded job.
+        error (str | None): The error of a failed job.
+        attempts (int): The number of times a worker has picked up the job.
+        created_at (datetime): The date and time when the job was submitted.
+        started_at (datetime | None): The date and time when the job was last picked up.
+        heartbeat_at (datetime | None): The date and time when the worker last reported
+            that it is still running the job.
+        finished_at (datetime | None): The date and time when the job succeeded or failed.
+    """
+
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(50))
+    params: Mapped[dict[str, Any]] = mapped_column(JSONB, server_default="{}")
+    status: Mapped[str] = mapped_column(String(20), default=JobStatus.PENDING, index=True)
+    progress: Mapped[int] = mapped_column(Integer, default=0)
+    result: Mapped[dict[str, Any] | None] = mapped_column(JSONB)
+    error: Mapped[str | None] = mapped_column(Text)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    started_at: Mapped[datetime | None] = mapped_column(DateTime)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    def __repr__(self) -> str:
+        return f"Job(id={self.id}, kind={self.kind}, status={self.status})"
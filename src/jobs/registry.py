@@ -0,0 +1,92 @@
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.jobs.models import Job
+
+JobRun = Callable[..., Awaitable[dict[str, Any]]]
+F = TypeVar("F", bound=JobRun)
+
+
+class JobContext:
+    """
+    A class passed to job handlers to report on the job being run.
+
+    Reports are written with a session of their own, so they are visible
+    while the handler's transaction is still open.
+
+    Attributes:
+        job_id (int): The id of the job being run.
+    """
+
+    def __init__(self, *, job_id: int, session_maker: async_sessionmaker[AsyncSession]) -> None:
+        self.job_id = job_id
+        self._session_maker = session_maker
+
+    async def report_progress(self, progress: int) -> None:
+        """
+        Asynchronously stores the completed share of the job.
+
+        Args:
+            progress (int): The completed share of the job, in percent.
+        """
+        await self._update(progress=max(0, min(progress, 100)), heartbeat_at=func.now())
+
+    async def heartbeat(self) -> None:
+        """
+        Asynchronously stores that the job is still being run.
+        """
+        await self._update(heartbeat_at=func.now())
+
+    async def _update(self, **values: Any) -> None:
+        async with self._session_maker() as db:
+            await db.execute(update(Job).where(Job.id == self.job_id).values(**values))
+            await db.commit()
+
+
+@dataclass(frozen=True)
+class JobHandler:
+    """
+    A class describing how to run one kind of job.
+
+    Attributes:
+        params_model (type[BaseModel]): The model the job parameters are validated with.
+        run (JobRun): The coroutine function running the job. It is called with the
+            keyword arguments db, params and context, and returns the job result.
+        available (Callable[[], bool]): Tells whether jobs of the kind can be run
+            in the current configuration, checked when they are submitted.
+    """
+
+    params_model: type[BaseModel]
+    run: JobRun
+    available: Callable[[], bool] = lambda: True
+
+
+handlers: dict[str, JobHandler] = {}
+
+
+def register_job(
+    kind: str, params_model: type[BaseModel], *, available: Callable[[], bool] = lambda: True
+) -> Callable[[F], F]:
+    """
+    Registers the decorated coroutine function as the handler of a kind of job.
+
+    Args:
+        kind (str): The kind of the job.
+        params_model (type[BaseModel]): The model the job parameters are validated with.
+        available (Callable[[], bool]): Tells whether jobs of the kind can be run
+            in the current configuration, checked when they are submitted.
+
+    Returns:
+        Callable[[F], F]: The decorator.
+    """
+
+    def decorator(run: F) -> F:
+        handlers[kind] = JobHandler(params_model=params_model, run=run, available=available)
+        return run
+
+    return decorator
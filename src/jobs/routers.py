@@ -0,0 +1,47 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Path, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.routing import SessionReleasingRoute
+from src.deps import get_db
+from src.jobs import crud
+from src.jobs.models import Job
+from src.jobs.schemas import JobCreate, JobFromDB
+
+router = APIRouter(prefix="/jobs", tags=["jobs"], route_class=SessionReleasingRoute)
+
+
+@router.post("/", response_model=JobFromDB, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(db: Annotated[AsyncSession, Depends(get_db)], job_in: JobCreate) -> Job:
+    """
+    Submits a new job to be run in the background.
+
+    Args:
+        db (Annotated[AsyncSession, Depends(get_db)]): The asynchronous database session.
+        job_in (JobCreate): A JobCreate object containing the kind and parameters of the job.
+
+    Returns:
+        Job: The newly created Job object.
+    """
+    job = await crud.create_job(db=db, job_in=job_in)
+    return job
+
+
+@router.get("/{job_id}/", response_model=JobFromDB, status_code=status.HTTP_200_OK)
+async def get_job_detail(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    job_id: Annotated[int, Path(ge=1)],
+) -> Job:
+    """
+    Retrieves the state, progress, result or error of a job.
+
+    Args:
+        db (Annotated[AsyncSession, Depends(get_db)]): The asynchronous database session.
+        job_id (Annotated[int, Path(ge=1)]): The id of the job to retrieve.
+
+    Returns:
+        Job: The Job object with the specified id.
+    """
+    job = await crud.get_job_by_id(db=db, job_id=job_id)
+    return job
@@ -0,0 +1,60 @@
+from datetime import datetime
+from enum import StrEnum
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class JobStatus(StrEnum):
+    """
+    An enumeration of the states of a background job.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobCreate(BaseModel):
+    """
+    A model for submitting a background job.
+
+    Attributes:
+        kind (str): The kind of the job, for example "users.import".
+        params (dict[str, Any]): The parameters of the job, validated by its handler.
+    """
+
+    kind: str = Field(max_length=50)
+    params: dict[str, Any] = Field(default_factory=dict)
+
+
+class JobFromDB(JobCreate):
+    """
+    A model for a background job retrieved from the database.
+
+    Inherits from JobCreate.
+
+    Attributes:
+        id (int): The unique identifier for the job.
+        status (JobStatus): The current state of the job.
+        progress (int): The completed share of the job, in percent.
+        result (dict[str, Any] | None): The result of a succeeded job.
+        error (str | None): The error of a failed job.
+        attempts (int): The number of times a worker has picked up the job.
+        created_at (datetime): The date and time when the job was submitted.
+        started_at (datetime | None): The date and time when the job was last picked up.
+        finished_at (datetime | None): The date and time when the job succeeded or failed.
+    """
+
+    id: int
+    status: JobStatus
+    progress: int
+    result: dict[str, Any] | None
+    error: str | None
+    attempts: int
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+
+    model_config = ConfigDict(from_attributes=True)
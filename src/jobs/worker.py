@@ -0,0 +1,128 @@
+import asyncio
+import contextlib
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.config import settings
+from src.jobs import crud
+from src.jobs.registry import JobContext, handlers
+
+logger = logging.getLogger(__name__)
+
+
+async def run_next_job(
+    *,
+    session_maker: async_sessionmaker[AsyncSession],
+    stale_after: float,
+    max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+) -> bool:
+    """
+    Asynchronously claims and runs one job.
+
+    The handler runs with a session of its own, while a heartbeat keeps the job
+    from being considered abandoned by other workers.
+
+    Args:
+        session_maker (async_sessionmaker[AsyncSession]): The factory of database sessions.
+        stale_after (float): The number of seconds without a heartbeat after which
+            a running job is considered abandoned.
+        max_attempts (int): The number of times a job is picked up before it is failed.
+
+    Returns:
+        bool: True if a job was run, False if there was no job to run.
+    """
+    async with session_maker() as db:
+        job = await crud.claim_job(db=db, stale_after=stale_after, max_attempts=max_attempts)
+    if job is None:
+        return False
+
+    context = JobContext(job_id=job.id, session_maker=session_maker)
+    heartbeat = asyncio.create_task(_keep_alive(context=context, interval=stale_after / 3))
+    try:
+        handler = handlers.get(job.kind)
+        if handler is None:
+            raise LookupError(f"Unknown job kind: {job.kind}")
+        params = handler.params_model.model_validate(job.params)
+        async with session_maker() as db:
+            result = await handler.run(db=db, params=params, context=context)
+    except Exception as exc:
+        logger.exception("Job %s failed", job.id)
+        error = str(exc) or exc.__class__.__name__
+        async with session_maker() as db:
+            await crud.finish_job(db=db, job_id=job.id, error=error)
+    else:
+        async with session_maker() as db:
+            await crud.finish_job(db=db, job_id=job.id, result=result)
+    finally:
+        heartbeat.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await heartbeat
+    return True
+
+
+async def _keep_alive(*, context: JobContext, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await context.heartbeat()
+
+
+class JobWorkerPool:
+    """
+    A class for a bounded pool of workers running jobs in the background.
+
+    Jobs interrupted by a shutdown stay running in the database and are picked up
+    again by any worker once their heartbeat is stale, up to max_attempts times.
+
+    Attributes:
+        size (int): The number of jobs run concurrently.
+        poll_interval (float): The number of seconds an idle worker waits before polling again.
+        stale_after (float): The number of seconds without a heartbeat after which
+            a running job is considered abandoned.
+        max_attempts (int): The number of times a job is picked up before it is failed.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_maker: async_sessionmaker[AsyncSession],
+        size: int,
+        poll_interval: float,
+        stale_after: float,
+        max_attempts: int,
+    ) -> None:
+        self.size = size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._session_maker = session_maker
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        """
+        Starts the workers.
+        """
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.size)]
+
+    async def stop(self) -> None:
+        """
+        Asynchronously stops the workers, interrupting the jobs they are running.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                ran = await run_next_job(
+                    session_maker=self._session_maker,
+                    stale_after=self.stale_after,
+                    max_attempts=self.max_attempts,
+                )
+            except Exception:
+                logger.exception("Job worker failed to run a job")
+                ran = False
+            if not ran:
+                await asyncio.sleep(self.poll_interval)
@@ -1,6 +1,71 @@
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
+from src.core.admission import AdmissionControlMiddleware, pool_timeout_handler
+from src.core.config import settings
+from src.core.db import async_session_maker
+from src.core.deadlines import DeadlineMiddleware
+from src.core.profiling import ProfilingMiddleware
+from src.core.routers import profiles_router
+from src.core.routers import router as metrics_router
+from src.core.sharding import shards
+from src.jobs.routers import router as jobs_router
+from src.jobs.worker import JobWorkerPool
+from src.users import jobs  # noqa: F401
 from src.users.routers import router
 
-app = FastAPI(description="Users API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    """
+    Runs the background job workers for the lifetime of the application
+    and closes the connections to the shards on shutdown.
+    """
+    worker_pool = JobWorkerPool(
+        session_maker=async_session_maker,
+        size=settings.JOB_WORKERS,
+        poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+        stale_after=settings.JOB_STALE_AFTER_SECONDS,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    )
+    worker_pool.start()
+    yield
+    await worker_pool.stop()
+    await shards.dispose()
+
+
+app = FastAPI(description="Users API", lifespan=lifespan)
 app.include_router(router, prefix="/api/v1")
+app.include_router(jobs_router, prefix="/api/v1")
+app.include_router(metrics_router, prefix="/api/v1")
+app.include_router(profiles_router, prefix="/api/v1")
+app.add_middleware(
+    DeadlineMiddleware,
+    deadlines={
+        "statistics": settings.DEADLINE_STATISTICS_SECONDS,
+        "read": settings.DEADLINE_READ_SECONDS,
+        "write": settings.DEADLINE_WRITE_SECONDS,
+    },
+)
+app.add_middleware(
+    AdmissionControlMiddleware,
+    budgets={
+        "statistics": settings.ADMISSION_STATISTICS_CONCURRENCY,
+        "read": settings.ADMISSION_READ_CONCURRENCY,
+        "write": settings.ADMISSION_WRITE_CONCURRENCY,
+    },
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_wait=settings.ADMISSION_MAX_WAIT_SECONDS,
+    retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+)
+app.add_middleware(
+    ProfilingMiddleware,
+    secret=settings.PROFILING_SECRET,
+    sample_rate=settings.PROFILING_SAMPLE_RATE,
+    directory=settings.PROFILING_DIR,
+    max_profiles=settings.PROFILING_MAX_PROFILES,
+)
+app.add_exception_handler(PoolTimeoutError, pool_timeout_handler)
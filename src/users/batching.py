@@ -0,0 +1,237 @@
+import asyncio
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException, status
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.deadlines import request_deadline
+from src.core.metrics import metrics
+from src.users.models import User
+from src.users.schemas import UserCreate
+
+
+def user_exists(field_name: str, value: str) -> HTTPException:
+    """
+    Builds the exception raised when a username or email is already taken.
+
+    Args:
+        field_name (str): The name of the taken field, username or email.
+        value (str): The taken value.
+
+    Returns:
+        HTTPException: A 400 Bad Request exception, as raised by crud.check_user_exists.
+    """
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"User with {field_name}: {value} already exists",
+    )
+
+
+@dataclass
+class PendingCreate:
+    """
+    A class for a create waiting to be flushed with its batch.
+
+    Attributes:
+        user_in (UserCreate): The user to create.
+        future (asyncio.Future[User]): The future receiving the created user or the error.
+    """
+
+    user_in: UserCreate
+    future: asyncio.Future[User] = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+
+
+class UserCreateBatcher:
+    """
+    A class for merging concurrent user creates into one multi-row insert.
+
+    Creates arriving within the window, up to max_size of them, are inserted in one
+    transaction, and every caller gets its own user or its own error about the taken field.
+
+    Attributes:
+        window (float): The number of seconds a batch collects creates before it is flushed.
+        max_size (int): The number of creates flushing a batch before the window ends.
+    """
+
+    def __init__(self, *, window: float, max_size: int) -> None:
+        self.window = window
+        self.max_size = max_size
+        self._batches: dict[async_sessionmaker[AsyncSession], list[PendingCreate]] = {}
+        self._flushes: set[asyncio.Task[None]] = set()
+
+    async def create(
+        self, *, session_maker: async_sessionmaker[AsyncSession], user_in: UserCreate
+    ) -> User:
+        """
+        Asynchronously creates the user with the next batch.
+
+        Args:
+            session_maker (async_sessionmaker[AsyncSession]): The factory of the session
+                the batch is inserted with.
+            user_in (UserCreate): A UserCreate object containing the new user's information.
+
+        Returns:
+            User: The newly created User object.
+
+        Raises:
+            HTTPException: If a user with the same username or email already exists,
+            or is created earlier in the same batch, a 400 Bad Request exception is raised.
+        """
+        pending = PendingCreate(user_in=user_in)
+        batch = self._batches.setdefault(session_maker, [])
+        batch.append(pending)
+        if len(batch) >= self.max_size:
+            del self._batches[session_maker]
+            self._start_flush(session_maker, batch, delay=0)
+        elif len(batch) == 1:
+            self._start_flush(session_maker, batch, delay=self.window)
+        # A cancelled caller does not cancel the batch, its user may still be created.
+        return await asyncio.shield(pending.future)
+
+    def _start_flush(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        batch: list[PendingCreate],
+        delay: float,
+    ) -> None:
+        task = asyncio.create_task(self._flush_later(session_maker, batch, delay))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush_later(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        batch: list[PendingCreate],
+        delay: float,
+    ) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+            if self._batches.get(session_maker) is not batch:
+                # The batch was already flushed because it became full.
+                return
+            del self._batches[session_maker]
+        metrics.inc("users_create_batches")
+        metrics.inc("users_create_batched", len(batch))
+        # The batch is shared by several requests, and not bounded by the deadline of the first.
+        request_deadline.set(None)
+        try:
+            async with session_maker() as db:
+                results: list[User | Exception] = list(
+                    await insert_users(db=db, users_in=[item.user_in for item in batch])
+                )
+        except Exception as exc:
+            results = [exc] * len(batch)
+        for item, result in zip(batch, results, strict=True):
+            if item.future.done():
+                continue
+            if isinstance(result, Exception):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+        for item in batch:
+            # Mark the exceptions as retrieved, their callers may have been cancelled.
+            if not item.future.cancelled():
+                item.future.exception()
+
+
+async def find_taken(*, db: AsyncSession, users_in: list[UserCreate]) -> tuple[set[str], set[str]]:
+    """
+    Asynchronously finds which of the usernames and emails of the users are taken.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        users_in (list[UserCreate]): The users to check.
+
+    Returns:
+        tuple[set[str], set[str]]: The taken usernames and the taken emails.
+    """
+    existing = await db.execute(
+        select(User.username, User.email).where(
+            or_(
+                User.username.in_([user_in.username for user_in in users_in]),
+                User.email.in_([user_in.email for user_in in users_in]),
+            )
+        )
+    )
+    taken_usernames, taken_emails = set(), set()
+    for username, email in existing.tuples():
+        taken_usernames.add(username)
+        taken_emails.add(email)
+    return taken_usernames, taken_emails
+
+
+def taken_field(
+    user_in: UserCreate, taken_usernames: set[str], taken_emails: set[str]
+) -> HTTPException | None:
+    """
+    Checks the username, then the email of the user against the taken ones.
+
+    Args:
+        user_in (UserCreate): The user to check.
+        taken_usernames (set[str]): The taken usernames.
+        taken_emails (set[str]): The taken emails.
+
+    Returns:
+        HTTPException | None: The 400 Bad Request exception about the taken field, if any.
+    """
+    if user_in.username in taken_usernames:
+        return user_exists("username", user_in.username)
+    if user_in.email in taken_emails:
+        return user_exists("email", user_in.email)
+    return None
+
+
+async def insert_users(
+    *, db: AsyncSession, users_in: list[UserCreate]
+) -> list[User | HTTPException]:
+    """
+    Asynchronously creates the users with one multi-row insert in one transaction.
+
+    Users whose username or email is taken, or sent earlier in the list, are skipped.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        users_in (list[UserCreate]): The users to create.
+
+    Returns:
+        list[User | HTTPException]: For each user to create, in order, the created User object
+        or the 400 Bad Request exception about its taken field.
+    """
+    taken_usernames, taken_emails = await find_taken(db=db, users_in=users_in)
+    results: list[User | HTTPException | None] = []
+    rows = []
+    for user_in in users_in:
+        error = taken_field(user_in, taken_usernames, taken_emails)
+        results.append(error)
+        if error is None:
+            rows.append({"username": user_in.username, "email": user_in.email})
+        taken_usernames.add(user_in.username)
+        taken_emails.add(user_in.email)
+    if not rows:
+        return [result for result in results if result is not None]
+
+    # Users created concurrently outside of the batch are skipped rather than failing it.
+    created = await db.scalars(insert(User).values(rows).on_conflict_do_nothing().returning(User))
+    created_users = {user.username: user for user in created.all()}
+    await db.commit()
+
+    skipped = [
+        user_in
+        for user_in, result in zip(users_in, results, strict=True)
+        if result is None and user_in.username not in created_users
+    ]
+    if skipped:
+        taken_usernames, taken_emails = await find_taken(db=db, users_in=skipped)
+    final_results: list[User | HTTPException] = []
+    for user_in, result in zip(users_in, results, strict=True):
+        if result is None:
+            result = created_users.get(user_in.username) or taken_field(
+                user_in, taken_usernames, taken_emails
+            )
+        # A concurrent create may have been deleted again before it could be reported.
+        final_results.append(result or user_exists("username", user_in.username))
+    return final_results
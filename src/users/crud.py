@@ -1,17 +1,38 @@
+import asyncio
+import heapq
+
 from fastapi import HTTPException, status
-from sqlalchemy import select, update
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 
-from src.users.models import User
-from src.users.schemas import UserCreate, UserUpdate
+from src.core.deadlines import request_deadline
+from src.core.sharding import shards
+from src.users.models import (
+    User,
+    UserDirectoryEntry,
+    UserTombstone,
+    change_feed_watermark,
+    user_id_seq,
+)
+from src.users.schemas import (
+    ChangeOperation,
+    UserChange,
+    UserChanges,
+    UserCreate,
+    UserFromDB,
+    UserPatch,
+    UserUpdate,
+)
 
 
-async def get_user_by_id(*, db: AsyncSession, user_id: int) -> User:
+async def find_user(*, db: AsyncSession, user_id: int) -> User:
     """
-    Asynchronously retrieves a user from the database by its id.
+    Asynchronously retrieves a user by its id from the database the session is bound to.
 
     Args:
-        db (AsyncSession): An asynchronous session for the database.
+        db (AsyncSession): An asynchronous session for the database, or for the shard of the user.
         user_id (int): The id of the user to retrieve.
 
     Returns:
@@ -29,37 +50,144 @@ async def get_user_by_id(*, db: AsyncSession, user_id: int) -> User:
     return user
 
 
-async def check_user_exists(*, db: AsyncSession, username: str, email: str) -> None:
+async def get_user_by_id(*, db: AsyncSession, user_id: int) -> User:
+    """
+    Asynchronously retrieves a user from the database, or from its shard, by its id.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        user_id (int): The id of the user to retrieve.
+
+    Returns:
+        User: The User object with the specified id.
+
+    Raises:
+        HTTPException: If the user with the specified id does not exist,
+        a 404 Not Found exception is raised.
+    """
+    async with shards.session_for(db, user_id) as session:
+        return await find_user(db=session, user_id=user_id)
+
+
+def version_mismatch(user_id: int) -> HTTPException:
+    """
+    Builds the exception raised when a user was changed since the client read it.
+
+    Args:
+        user_id (int): The id of the user.
+
+    Returns:
+        HTTPException: A 412 Precondition Failed exception.
+    """
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail=f"User with id: {user_id} has been modified by another request",
+    )
+
+
+async def check_user_exists(
+    *, db: AsyncSession, username: str | None = None, email: str | None = None
+) -> None:
     """
     Asynchronously checks if a user with the given username or email already exists in the database.
 
+    With sharding the directory is checked, as the users of other shards are not visible.
+
     Args:
         db (AsyncSession): An asynchronous session for the database.
-        username (str): The username to check for.
-        email (str): The email to check for.
+        username (str | None): The username to check for, skipped if None.
+        email (str | None): The email to check for, skipped if None.
 
     Raises:
         HTTPException: If a user with the given username or email already exists,
             a 400 Bad Request exception is raised with an appropriate error message.
     """
-    exists_user = await db.scalar(select(User).where(User.username == username))
+    model = UserDirectoryEntry if shards.enabled else User
+    if username is not None:
+        exists_user = await db.scalar(select(model).where(model.username == username))
+        if exists_user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"User with username: {username} already exists",
+            )
+    if email is None:
+        return
+    exists_user = await db.scalar(select(model).where(model.email == email))
     if exists_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"User with username: {username} already exists",
+            detail=f"User with email: {email} already exists",
         )
-    exists_user = await db.scalar(select(User).where(User.email == email))
-    if exists_user:
+
+
+async def commit_directory(
+    *, db: AsyncSession, username: str | None = None, email: str | None = None
+) -> None:
+    """
+    Asynchronously commits changes to the directory, claiming the given username and email.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the main database.
+        username (str | None): The username being claimed, None if unchanged.
+        email (str | None): The email being claimed, None if unchanged.
+
+    Raises:
+        HTTPException: If a concurrent request claimed the username or email first,
+        a 400 Bad Request exception is raised.
+    """
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        await check_user_exists(db=db, username=username, email=email)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"User with email: {email} already exists",
+            detail="User with this username or email already exists",
         )
 
 
+async def sync_directory_entry(*, db: AsyncSession, user_id: int) -> None:
+    """
+    Asynchronously makes the directory entry of a user match the user stored on its shard.
+
+    Writes commit to the directory before the shard, so a write interrupted in between
+    is compensated with this: the entry is deleted if the user is not on its shard, and gets
+    its username and email back otherwise. It runs in sessions of its own and is carried
+    through even if the request is cancelled, or its deadline has expired.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the main database, whose engine is used.
+        user_id (int): The id of the user.
+    """
+
+    async def sync() -> None:
+        # The statements are not bounded by the deadline of the request being compensated.
+        request_deadline.set(None)
+        async with AsyncSession(db.bind) as directory:
+            async with shards.session_for(directory, user_id) as session:
+                user = await session.scalar(select(User).where(User.id == user_id))
+            entry = UserDirectoryEntry.user_id == user_id
+            if user is None:
+                await directory.execute(delete(UserDirectoryEntry).where(entry))
+            else:
+                await directory.execute(
+                    update(UserDirectoryEntry)
+                    .where(entry)
+                    .values(username=user.username, email=user.email)
+                )
+            await directory.commit()
+
+    await asyncio.shield(sync())
+
+
 async def get_users(*, db: AsyncSession, page: int, size: int) -> list[User]:
     """
     Asynchronously fetches a list of users from the database based on the page and size parameters.
 
+    Users are ordered by id, so pages are stable. With sharding the first page * size users
+    are fetched from every shard concurrently and merged, so deep pages grow more expensive
+    with the number of shards.
+
     Args:
         db (AsyncSession): An asynchronous session for the database.
         page (int): The page number to fetch.
@@ -68,14 +196,114 @@ async def get_users(*, db: AsyncSession, page: int, size: int) -> list[User]:
     Returns:
         list[User]: A list of User objects for the specified page and size.
     """
-    users = await db.scalars(select(User).limit(size).offset((page - 1) * size))
-    return list(users.all())
+    if not shards.enabled:
+        users = await db.scalars(
+            select(User).order_by(User.id).limit(size).offset((page - 1) * size)
+        )
+        return list(users.all())
+
+    async def fetch_shard_users(session: AsyncSession) -> list[User]:
+        users = await session.scalars(select(User).order_by(User.id).limit(page * size))
+        return list(users.all())
+
+    shard_users = await shards.gather(db, fetch_shard_users)
+    merged = heapq.merge(*shard_users, key=lambda user: user.id)
+    return list(merged)[(page - 1) * size : page * size]
+
+
+def check_change_feed_shard(shard: int | None) -> None:
+    """
+    Checks the shard whose change feed is requested.
+
+    Positions are only ordered within a database, so with sharding every shard
+    has a feed of its own, read with a cursor of its own.
+
+    Args:
+        shard (int | None): The index of the shard, None without sharding.
+
+    Raises:
+        HTTPException: If users are sharded and no shard or an unknown shard is requested,
+        or if a shard other than 0 is requested without sharding,
+        a 400 Bad Request exception is raised.
+    """
+    shard_count = len(shards.engines) if shards.enabled else 1
+    if shards.enabled and shard is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Users are spread across {shard_count} shards, the shard is required",
+        )
+    if shard is not None and shard >= shard_count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The shard must be lower than {shard_count}",
+        )
+
+
+async def get_user_changes(
+    *, db: AsyncSession, since: int, limit: int, shard: int | None = None
+) -> UserChanges:
+    """
+    Asynchronously fetches the changes of users after the given cursor.
+
+    Each user appears once with its latest state, deleted users appear as tombstones.
+    Positions start with the id of the writing transaction, and only positions below the
+    oldest transaction still running are returned, so a change is never read after a later
+    position has been: the feed lags behind by at most the longest running write.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        since (int): The cursor returned by the previous call, 0 to start from the beginning.
+        limit (int): The maximum number of changes to fetch.
+        shard (int | None): The index of the shard to read, required with sharding.
+
+    Returns:
+        UserChanges: A UserChanges object with the changes and the cursor to continue from.
+
+    Raises:
+        HTTPException: If the shard is missing or unknown, a 400 Bad Request exception is raised.
+    """
+    check_change_feed_shard(shard)
+    async with shards.session_at(db, shard or 0) as session:
+        watermark = (await session.execute(select(change_feed_watermark))).scalar_one()
+        users = await session.scalars(
+            select(User)
+            .where(User.change_seq > since, User.change_seq < watermark)
+            .order_by(User.change_seq)
+            .limit(limit)
+        )
+        tombstones = await session.scalars(
+            select(UserTombstone)
+            .where(UserTombstone.change_seq > since, UserTombstone.change_seq < watermark)
+            .order_by(UserTombstone.change_seq)
+            .limit(limit)
+        )
+    changes = [
+        UserChange(
+            seq=user.change_seq,
+            operation=ChangeOperation.UPSERT,
+            user_id=user.id,
+            user=UserFromDB.model_validate(user),
+        )
+        for user in users.all()
+    ]
+    changes.extend(
+        UserChange(
+            seq=tombstone.change_seq, operation=ChangeOperation.DELETE, user_id=tombstone.user_id
+        )
+        for tombstone in tombstones.all()
+    )
+    changes = sorted(changes, key=lambda change: change.seq)[:limit]
+    return UserChanges(changes=changes, next_cursor=changes[-1].seq if changes else since)
 
 
 async def create_user(*, db: AsyncSession, user_in: UserCreate) -> User:
     """
     Asynchronously creates a new user in the database.
 
+    With sharding the id is taken from the main database and the user is claimed
+    in the directory before it is written to its shard. If the shard write fails,
+    the claim is released.
+
     Args:
         db (AsyncSession): An asynchronous session for the database.
         user_in (UserCreate): A UserCreate object containing the new user's information.
@@ -88,34 +316,90 @@ async def create_user(*, db: AsyncSession, user_in: UserCreate) -> User:
         a 400 Bad Request exception is raised.
     """
     await check_user_exists(db=db, username=user_in.username, email=user_in.email)
-    user = User(username=user_in.username, email=user_in.email)
-    db.add(user)
-    await db.commit()
-    await db.refresh(user)
+    if not shards.enabled:
+        user = User(username=user_in.username, email=user_in.email)
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        return user
+
+    user_id = (await db.execute(select(user_id_seq.next_value()))).scalar_one()
+    db.add(UserDirectoryEntry(user_id=user_id, username=user_in.username, email=user_in.email))
+    await commit_directory(db=db, username=user_in.username, email=user_in.email)
+    try:
+        async with shards.session_for(db, user_id) as session:
+            user = User(id=user_id, username=user_in.username, email=user_in.email)
+            session.add(user)
+            await session.commit()
+            await session.refresh(user)
+    except BaseException:
+        await sync_directory_entry(db=db, user_id=user_id)
+        raise
     return user
 
 
-async def update_user(*, db: AsyncSession, user_in: UserUpdate, user_id: int) -> User:
+async def update_user(
+    *,
+    db: AsyncSession,
+    user_in: UserUpdate | UserPatch,
+    user_id: int,
+    expected_version: int | None = None,
+) -> User:
     """
     Asynchronously updates a user in the database.
 
+    Only the fields that were sent and differ from the stored ones are checked and written.
+    The update is applied only if the user still has the version it was read with.
+    With sharding the directory is updated first, and restored if the shard write fails.
+
     Args:
         db (AsyncSession): An asynchronous session for the database.
-        user_in (UserUpdate): A UserUpdate object containing the updated user's information.
+        user_in (UserUpdate | UserPatch): An object containing the updated user's information.
         user_id (int): The id of the user to update.
+        expected_version (int | None): The version the client last read, None to skip the check.
 
     Returns:
         User: The updated User object.
 
     Raises:
         HTTPException: If a user with the same username or email already exists,
-        a 400 Bad Request exception is raised.
+        a 400 Bad Request exception is raised. If the user was modified since it was read
+        with expected_version, or concurrently, a 412 Precondition Failed exception is raised.
     """
-    user = await get_user_by_id(db=db, user_id=user_id)
-    await check_user_exists(db=db, username=user_in.username, email=user_in.email)
-    await db.execute(update(User).where(User.id == user_id).values(user_in.model_dump()))
-    await db.commit()
-    await db.refresh(user)
+    async with shards.session_for(db, user_id) as session:
+        user = await find_user(db=session, user_id=user_id)
+        if expected_version is not None and user.version != expected_version:
+            raise version_mismatch(user_id)
+        changes = {
+            field: value
+            for field, value in user_in.model_dump(exclude_unset=True).items()
+            if getattr(user, field) != value
+        }
+        if not changes:
+            return user
+        await check_user_exists(db=db, username=changes.get("username"), email=changes.get("email"))
+        if shards.enabled:
+            await db.execute(
+                update(UserDirectoryEntry)
+                .where(UserDirectoryEntry.user_id == user_id)
+                .values(**changes)
+            )
+            await commit_directory(
+                db=db, username=changes.get("username"), email=changes.get("email")
+            )
+        for field, value in changes.items():
+            setattr(user, field, value)
+        try:
+            try:
+                await session.commit()
+            except StaleDataError:
+                await session.rollback()
+                raise version_mismatch(user_id)
+        except BaseException:
+            if shards.enabled:
+                await sync_directory_entry(db=db, user_id=user_id)
+            raise
+        await session.refresh(user)
     return user
 
 
@@ -123,10 +407,23 @@ async def delete_user(*, db: AsyncSession, user_id: int) -> None:
     """
     Asynchronously deletes a user from the database.
 
+    With sharding the user is deleted from its shard first, then from the directory.
+
     Args:
         db (AsyncSession): An asynchronous session for the database.
         user_id (int): The id of the user to delete.
+
+    Raises:
+        HTTPException: If the user was modified concurrently,
+        a 412 Precondition Failed exception is raised.
     """
-    user = await get_user_by_id(db=db, user_id=user_id)
-    await db.delete(user)
-    await db.commit()
+    async with shards.session_for(db, user_id) as session:
+        user = await find_user(db=session, user_id=user_id)
+        await session.delete(user)
+        try:
+            await session.commit()
+        except StaleDataError:
+            await session.rollback()
+            raise version_mismatch(user_id)
+    if shards.enabled:
+        await sync_directory_entry(db=db, user_id=user_id)
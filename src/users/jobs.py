@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta
+from typing import Annotated, Any
+
+from pydantic import BaseModel, Field, model_validator
+from sqlalchemy import ColumnElement, delete, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.sharding import shards
+from src.jobs.registry import JobContext, register_job
+from src.users import services
+from src.users.models import User, UserRegistrationRollup
+from src.users.schemas import CountAccuracy, UserCreate
+
+BATCH_SIZE = 500
+
+
+def is_unsharded() -> bool:
+    """
+    Tells whether users are stored in one database, which jobs writing users in bulk require.
+
+    Returns:
+        bool: True if users are not sharded.
+    """
+    return not shards.enabled
+
+
+Domain = Annotated[str, Field(max_length=50, pattern=r"^[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")]
+
+
+class ImportUsersParams(BaseModel):
+    """
+    A model for the parameters of a users import.
+
+    Attributes:
+        users (list[UserCreate]): The users to create.
+    """
+
+    users: list[UserCreate] = Field(min_length=1, max_length=100_000)
+
+
+class PurgeUsersParams(BaseModel):
+    """
+    A model for the parameters of a users purge, at least one filter is required.
+
+    Attributes:
+        domain (str | None): The domain of the email addresses of the users to delete.
+        registered_before (datetime | None): The date and time before which
+            the users to delete were registered.
+    """
+
+    domain: Domain | None = None
+    registered_before: datetime | None = None
+
+    @model_validator(mode="after")
+    def check_filter(self) -> "PurgeUsersParams":
+        if self.domain is None and self.registered_before is None:
+            raise ValueError("Either domain or registered_before is required")
+        return self
+
+
+class RecomputeStatisticsParams(BaseModel):
+    """
+    A model for the parameters of a statistics recompute.
+
+    Attributes:
+        domain (str | None): The domain to filter users by.
+        hours (int): The number of most recent hours whose registration rollups are rebuilt.
+    """
+
+    domain: Domain | None = None
+    hours: int = Field(default=24 * 7, ge=1, le=24 * 366)
+
+
+@register_job("users.import", ImportUsersParams, available=is_unsharded)
+async def import_users(
+    *, db: AsyncSession, params: ImportUsersParams, context: JobContext
+) -> dict[str, Any]:
+    """
+    Asynchronously creates users with one multi-row insert per batch,
+    skipping those whose username or email is taken.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        params (ImportUsersParams): The users to create.
+        context (JobContext): The context to report progress to.
+
+    Returns:
+        dict[str, Any]: The number of created and skipped users.
+    """
+    created = skipped = 0
+    for start in range(0, len(params.users), BATCH_SIZE):
+        batch = params.users[start : start + BATCH_SIZE]
+        # Users whose username or email is taken, concurrently or earlier in the batch,
+        # are skipped by the insert rather than failing it.
+        created_ids = await db.scalars(
+            insert(User)
+            .values([{"username": user_in.username, "email": user_in.email} for user_in in batch])
+            .on_conflict_do_nothing()
+            .returning(User.id)
+        )
+        created_count = len(created_ids.all())
+        await db.commit()
+        created += created_count
+        skipped += len(batch) - created_count
+        await context.report_progress((start + len(batch)) * 100 // len(params.users))
+    return {"created": created, "skipped": skipped}
+
+
+@register_job("users.purge", PurgeUsersParams, available=is_unsharded)
+async def purge_users(
+    *, db: AsyncSession, params: PurgeUsersParams, context: JobContext
+) -> dict[str, Any]:
+    """
+    Asynchronously deletes the users matching the filters with one statement per batch.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        params (PurgeUsersParams): The filters of the users to delete.
+        context (JobContext): The context to report progress to.
+
+    Returns:
+        dict[str, Any]: The number of deleted users.
+    """
+    conditions: list[ColumnElement[bool]] = []
+    if params.domain is not None:
+        conditions.append(User.email.like(f"%@{params.domain}"))
+    if params.registered_before is not None:
+        conditions.append(User.registration < params.registered_before)
+
+    total = await db.scalar(select(func.count(User.id)).where(*conditions)) or 0
+    batch = select(User.id).where(*conditions).order_by(User.id).limit(BATCH_SIZE)
+    deleted = 0
+    # Each batch is one statement, the triggers on the users table record its tombstones
+    # and update the registration rollups once per statement.
+    while deleted_ids := (
+        await db.scalars(
+            delete(User)
+            .where(User.id.in_(batch))
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        )
+    ).all():
+        await db.commit()
+        deleted += len(deleted_ids)
+        await context.report_progress(deleted * 100 // max(total, deleted))
+    return {"deleted": deleted}
+
+
+@register_job("users.statistics", RecomputeStatisticsParams)
+async def recompute_statistics(
+    *, db: AsyncSession, params: RecomputeStatisticsParams, context: JobContext
+) -> dict[str, Any]:
+    """
+    Asynchronously rebuilds the recent registration rollups from the users table of every shard
+    and computes exact user statistics.
+
+    Writes to users are held while the rollups of a shard are rebuilt, so the triggers
+    cannot update them concurrently. Only the given number of hours is rebuilt,
+    which bounds how long writes are held.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        params (RecomputeStatisticsParams): The domain to filter users by and the hours to rebuild.
+        context (JobContext): The context to report progress to.
+
+    Returns:
+        dict[str, Any]: The user statistics.
+    """
+    # The unit is rendered inline, so that the select and group by expressions match.
+    bucket = func.date_trunc(literal_column("'hour'"), User.registration)
+    start = func.date_trunc(
+        literal_column("'hour'"), func.localtimestamp() - timedelta(hours=params.hours)
+    )
+
+    async def rebuild_shard_rollups(session: AsyncSession) -> None:
+        await session.execute(text("LOCK TABLE users IN SHARE MODE"))
+        await session.execute(
+            delete(UserRegistrationRollup).where(UserRegistrationRollup.bucket >= start)
+        )
+        await session.execute(
+            insert(UserRegistrationRollup).from_select(
+                ["bucket", "registrations"],
+                select(bucket, func.count(User.id))
+                .where(User.registration >= start)
+                .group_by(bucket),
+            )
+        )
+        await session.commit()
+
+    await shards.gather(db, rebuild_shard_rollups)
+    await context.report_progress(50)
+
+    user_statistics = await services.get_user_statistics(
+        db=db, domain=params.domain, accuracy=CountAccuracy.EXACT
+    )
+    return user_statistics.model_dump(mode="json", by_alias=True)
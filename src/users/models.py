@@ -1,10 +1,27 @@
 from datetime import datetime
+from typing import Any
 
-from sqlalchemy import BigInteger, DateTime, String, func
+from sqlalchemy import (
+    BigInteger,
+    ColumnClause,
+    Connection,
+    DateTime,
+    FetchedValue,
+    Integer,
+    Sequence,
+    String,
+    Table,
+    event,
+    func,
+    literal_column,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column
 
 from src.core.db import BaseORM
 
+user_id_seq = Sequence("user_id_seq", metadata=BaseORM.metadata)
+
 
 class User(BaseORM):
     """
@@ -15,6 +32,11 @@ class User(BaseORM):
         username (str): The username of the user.
         email (str): The email of the user.
         registration (datetime): The date and time when the user was registered.
+        updated_at (datetime): The date and time when the user was last created or updated.
+        change_seq (int): The position of the last change of the user in the change feed,
+            set by a trigger.
+        version (int): The version of the user, incremented on every update
+            and checked by the ORM to detect concurrent updates.
     """
 
     __tablename__ = "users"
@@ -22,7 +44,208 @@ class User(BaseORM):
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     username: Mapped[str] = mapped_column(String(255), unique=True)
     email: Mapped[str] = mapped_column(String(255), unique=True)
-    registration: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    registration: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), index=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger, server_default=FetchedValue(), server_onupdate=FetchedValue(), index=True
+    )
+    version: Mapped[int] = mapped_column(Integer, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self) -> str:
         return f"User(id={self.id}, username={self.username}, email={self.email})"
+
+
+class UserDirectoryEntry(BaseORM):
+    """
+    Represents a user in the directory of a sharded deployment.
+
+    The directory lives in the main database and keeps usernames and emails
+    unique across shards, the users themselves are stored on their shards.
+
+    Attributes:
+        user_id (int): The id of the user, taken from user_id_seq.
+        username (str): The username of the user.
+        email (str): The email of the user.
+    """
+
+    __tablename__ = "user_directory"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    username: Mapped[str] = mapped_column(String(255), unique=True)
+    email: Mapped[str] = mapped_column(String(255), unique=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"UserDirectoryEntry(user_id={self.user_id}, username={self.username}, "
+            f"email={self.email})"
+        )
+
+
+class UserRegistrationRollup(BaseORM):
+    """
+    Represents the number of users registered within one hour.
+
+    Rows are maintained incrementally by triggers on the users table, whatever writes to it,
+    so registration statistics never have to scan the users table.
+
+    Attributes:
+        bucket (datetime): The start of the hour.
+        registrations (int): The number of users registered within the hour.
+    """
+
+    __tablename__ = "user_registration_rollups"
+
+    bucket: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    registrations: Mapped[int] = mapped_column(BigInteger, default=0)
+
+    def __repr__(self) -> str:
+        return f"UserRegistrationRollup(bucket={self.bucket}, registrations={self.registrations})"
+
+
+class UserTombstone(BaseORM):
+    """
+    Represents a deleted user in the change feed, recorded by a trigger on the users table.
+
+    Attributes:
+        change_seq (int): The position of the deletion in the change feed.
+        user_id (int): The id of the deleted user.
+        deleted_at (datetime): The date and time when the user was deleted.
+    """
+
+    __tablename__ = "user_tombstones"
+
+    change_seq: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f"UserTombstone(change_seq={self.change_seq}, user_id={self.user_id})"
+
+
+# Changes are positioned by the id of their transaction, shifted left by CHANGE_POSITION_SHIFT,
+# plus a counter within the transaction. Positions below the oldest running transaction are
+# final, so the change feed only returns those and never skips a change committed late.
+# The same SQL is in revision 5a9c2e7d1f48.
+CHANGE_POSITION_SHIFT = 20
+CHANGE_FEED_FUNCTIONS = [
+    f"""
+    CREATE OR REPLACE FUNCTION user_change_position() RETURNS bigint
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        counter integer := coalesce(
+            nullif(current_setting('users.change_counter', true), ''), '0'
+        )::integer + 1;
+    BEGIN
+        IF counter >= (1 << {CHANGE_POSITION_SHIFT}) THEN
+            RAISE EXCEPTION 'Too many user changes in one transaction';
+        END IF;
+        PERFORM set_config('users.change_counter', counter::text, true);
+        RETURN (pg_current_xact_id()::text::bigint << {CHANGE_POSITION_SHIFT}) | counter;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION set_user_change_seq() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.change_seq := user_change_position();
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION record_user_tombstones() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO user_tombstones (change_seq, user_id)
+        SELECT user_change_position(), id FROM old_users;
+        RETURN NULL;
+    END
+    $$
+    """,
+]
+CHANGE_FEED_TRIGGERS = [
+    "CREATE TRIGGER users_change_seq BEFORE INSERT OR UPDATE ON users "
+    "FOR EACH ROW EXECUTE FUNCTION set_user_change_seq()",
+    "CREATE TRIGGER users_tombstones AFTER DELETE ON users "
+    "REFERENCING OLD TABLE AS old_users "
+    "FOR EACH STATEMENT EXECUTE FUNCTION record_user_tombstones()",
+]
+# The change position of the oldest running transaction, all writes below it have finished.
+change_feed_watermark: ColumnClause[int] = literal_column(
+    f"pg_snapshot_xmin(pg_current_snapshot())::text::bigint << {CHANGE_POSITION_SHIFT}",
+    type_=BigInteger,
+)
+
+# Statement-level triggers count every insert, update and delete of users in one upsert
+# per statement, including bulk and manual writes. The same SQL is in revision 3f1c9a7b2d84.
+REGISTRATION_ROLLUPS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION update_user_registration_rollups() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            UPDATE user_registration_rollups AS rollups
+            SET registrations = rollups.registrations - deleted.registrations
+            FROM (
+                SELECT date_trunc('hour', registration) AS bucket, count(*) AS registrations
+                FROM old_users
+                GROUP BY 1
+            ) AS deleted
+            WHERE rollups.bucket = deleted.bucket;
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO user_registration_rollups (bucket, registrations)
+            SELECT date_trunc('hour', registration), count(*)
+            FROM new_users
+            GROUP BY 1
+            ON CONFLICT (bucket) DO UPDATE
+            SET registrations = user_registration_rollups.registrations + excluded.registrations;
+        ELSE
+            INSERT INTO user_registration_rollups (bucket, registrations)
+            SELECT bucket, sum(delta)
+            FROM (
+                SELECT date_trunc('hour', registration) AS bucket, 1 AS delta FROM new_users
+                UNION ALL
+                SELECT date_trunc('hour', registration), -1 FROM old_users
+            ) AS changes
+            GROUP BY bucket
+            HAVING sum(delta) <> 0
+            ON CONFLICT (bucket) DO UPDATE
+            SET registrations = user_registration_rollups.registrations + excluded.registrations;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+REGISTRATION_ROLLUP_TRIGGERS = [
+    "CREATE TRIGGER users_registration_rollups_insert AFTER INSERT ON users "
+    "REFERENCING NEW TABLE AS new_users "
+    "FOR EACH STATEMENT EXECUTE FUNCTION update_user_registration_rollups()",
+    "CREATE TRIGGER users_registration_rollups_update AFTER UPDATE ON users "
+    "REFERENCING OLD TABLE AS old_users NEW TABLE AS new_users "
+    "FOR EACH STATEMENT EXECUTE FUNCTION update_user_registration_rollups()",
+    "CREATE TRIGGER users_registration_rollups_delete AFTER DELETE ON users "
+    "REFERENCING OLD TABLE AS old_users "
+    "FOR EACH STATEMENT EXECUTE FUNCTION update_user_registration_rollups()",
+]
+
+
+@event.listens_for(User.__table__, "after_create")
+def create_user_triggers(target: Table, connection: Connection, **kw: Any) -> None:
+    """
+    Creates the triggers maintaining the change feed and the registration rollups,
+    for tables created from the models.
+    """
+    for statement in [
+        *CHANGE_FEED_FUNCTIONS,
+        *CHANGE_FEED_TRIGGERS,
+        REGISTRATION_ROLLUPS_FUNCTION,
+        *REGISTRATION_ROLLUP_TRIGGERS,
+    ]:
+        connection.execute(text(statement))
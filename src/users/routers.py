@@ -1,19 +1,65 @@
+from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Path, Query, status
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Header, Path, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from src.deps import get_db
+from src.core.admission import admitted
+from src.core.config import settings
+from src.core.idempotency import IdempotencyStore, StoredResponse
+from src.core.routing import SessionReleasingRoute
+from src.core.sharding import shards
+from src.core.singleflight import SingleFlight
+from src.deps import get_db, get_if_match_version, get_session_maker
 from src.users import crud, services
+from src.users.batching import UserCreateBatcher
 from src.users.models import User
-from src.users.schemas import UserCreate, UserFromDB, UserStatistics, UserUpdate
+from src.users.schemas import (
+    CountAccuracy,
+    RegistrationBucket,
+    RegistrationInterval,
+    UserChanges,
+    UserCreate,
+    UserFromDB,
+    UserPatch,
+    UserStatistics,
+    UserUpdate,
+)
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=SessionReleasingRoute)
+
+statistics_flight = SingleFlight("users_statistics")
+user_detail_flight = SingleFlight("users_detail")
+user_creates = IdempotencyStore(
+    "users_create",
+    ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_size=settings.IDEMPOTENCY_MAX_KEYS,
+)
+user_create_batcher = (
+    UserCreateBatcher(
+        window=settings.USER_CREATE_BATCH_WINDOW_MS / 1000,
+        max_size=settings.USER_CREATE_BATCH_MAX_SIZE,
+    )
+    if settings.USER_CREATE_BATCH_WINDOW_MS > 0
+    else None
+)
+
+
+def set_etag(response: Response, user: User | UserFromDB) -> None:
+    """
+    Sets the version of the user as the ETag of the response, to be sent back in If-Match.
+
+    Args:
+        response (Response): The response to set the header on.
+        user (User | UserFromDB): The user returned in the response.
+    """
+    response.headers["ETag"] = f'"{user.version}"'
 
 
 @router.get("/statistics/", response_model=UserStatistics, status_code=status.HTTP_200_OK)
 async def get_user_statistics(
-    db: Annotated[AsyncSession, Depends(get_db)],
+    session_maker: Annotated[async_sessionmaker[AsyncSession], Depends(get_session_maker)],
     domain: Annotated[
         str | None,
         Query(
@@ -22,102 +68,294 @@ async def get_user_statistics(
             example="example.com",
         ),
     ] = None,
+    accuracy: Annotated[
+        CountAccuracy, Query(description="exact counts or approximate ones with bounded staleness")
+    ] = CountAccuracy.EXACT,
 ) -> UserStatistics:
     """
     Retrieves user statistics from the database.
 
+    Identical concurrent requests share one set of queries, run with a session
+    and an admission permit of the first request only.
+
     Args:
-        db (Annotated[AsyncSession, Depends(get_db)]): The asynchronous database session.
+        session_maker (async_sessionmaker[AsyncSession]): The factory of database sessions.
         domain (Annotated[str, Query(min_length=3, max_length=50,
         regex=r"^[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}$")]): The domain to filter users by.
+        accuracy (CountAccuracy): The way users are counted.
 
     Returns:
         UserStatistics: A UserStatistics object containing the user statistics.
     """
-    user_statistics = UserStatistics(
-        users_registered_seven_days_ago=await services.count_user_registered_last_seven_days(db=db),
-        top_five_users_with_longest_names=await services.top_five_users_with_longest_names(db=db),
-        percent_of_users_with_specific_domain=await services.percentage_users_with_specific_domain(
-            db=db, domain=domain
-        ),
-    )
+
+    async def compute() -> UserStatistics:
+        async with admitted(), session_maker() as db:
+            return await services.get_user_statistics(db=db, domain=domain, accuracy=accuracy)
+
+    user_statistics = await statistics_flight.do((domain, accuracy), compute)
     return user_statistics
 
 
+@router.get(
+    "/registrations/", response_model=list[RegistrationBucket], status_code=status.HTTP_200_OK
+)
+async def get_registration_series(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    start: Annotated[datetime, Query(description="the start of the range")],
+    end: Annotated[datetime | None, Query(description="the end of the range, exclusive")] = None,
+    interval: Annotated[
+        RegistrationInterval, Query(description="the interval to bucket registrations by")
+    ] = RegistrationInterval.DAY,
+) -> list[RegistrationBucket]:
+    """
+    Retrieves the number of users registered within each interval of the given range.
+
+    Args:
+        db (Annotated[AsyncSession, Depends(get_db)]): The asynchronous database session.
+        start (datetime): The start of the range.
+        end (datetime | None): The end of the range, exclusive. Defaults to now.
+        interval (RegistrationInterval): The interval to bucket registrations by.
+
+    Returns:
+        list[RegistrationBucket]: The number of registrations per interval.
+    """
+    series = await services.get_registration_series(
+        db=db, interval=interval, start=start, end=end or datetime.now()
+    )
+    return series
+
+
+@router.get("/changes/", response_model=UserChanges, status_code=status.HTTP_200_OK)
+async def get_user_changes(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    since: Annotated[int, Query(ge=0, description="the cursor of the previous page")] = 0,
+    limit: Annotated[int, Query(ge=1, le=1000, description="the number of changes")] = 100,
+    shard: Annotated[int | None, Query(ge=0, description="the shard to read")] = None,
+) -> UserChanges:
+    """
+    Retrieves the changes of users after the given cursor.
+
+    Args:
+        db (Annotated[AsyncSession, Depends(get_db)]): The asynchronous database session.
+        since (int): The cursor returned by the previous page, 0 to start from the beginning.
+        limit (int): The maximum number of changes to return.
+        shard (int | None): The index of the shard to read, required with sharding.
+
+    Returns:
+        UserChanges: A UserChanges object with the changes and the cursor to continue from.
+    """
+    changes = await crud.get_user_changes(db=db, since=since, limit=limit, shard=shard)
+    return changes
+
+
+@router.get("/changes/stream/", response_class=StreamingResponse)
+async def stream_user_changes(
+    request: Request,
+    session_maker: Annotated[async_sessionmaker[AsyncSession], Depends(get_session_maker)],
+    since: Annotated[int, Query(ge=0, description="the cursor to start streaming after")] = 0,
+    last_event_id: Annotated[int | None, Header(ge=0)] = None,
+    shard: Annotated[int | None, Query(ge=0, description="the shard to stream")] = None,
+) -> StreamingResponse:
+    """
+    Streams the changes of users after the given cursor as Server-Sent Events.
+
+    Reconnecting clients resume from the Last-Event-ID header, which takes precedence over since.
+
+    Args:
+        request (Request): The request, used to detect disconnected clients.
+        session_maker (async_sessionmaker[AsyncSession]): The factory of database sessions.
+        since (int): The cursor to start streaming after.
+        last_event_id (int | None): The id of the last event received before reconnecting.
+        shard (int | None): The index of the shard to stream, required with sharding.
+
+    Returns:
+        StreamingResponse: The stream of changes.
+
+    Raises:
+        HTTPException: If the shard is missing or unknown, a 400 Bad Request exception is raised.
+    """
+    crud.check_change_feed_shard(shard)
+    events = services.stream_user_changes(
+        session_maker=session_maker,
+        since=since if last_event_id is None else last_event_id,
+        shard=shard,
+        is_disconnected=request.is_disconnected,
+    )
+    return StreamingResponse(events, media_type="text/event-stream")
+
+
 @router.get("/", response_model=list[UserFromDB], status_code=status.HTTP_200_OK)
 async def get_users(
     db: Annotated[AsyncSession, Depends(get_db)],
+    response: Response,
     page: Annotated[int, Query(ge=1, description="the number of page")] = 1,
     size: Annotated[int, Query(ge=1, description="the number of users to show", example=25)] = 25,
+    accuracy: Annotated[
+        CountAccuracy, Query(description="the way the X-Total-Count header is counted")
+    ] = CountAccuracy.APPROX,
 ) -> list[User]:
     """
     Asynchronously fetches a list of users from the database based on the page and size parameters.
 
+    The total number of users is returned in the X-Total-Count header, approximate unless
+    an exact count is requested, and the way it was actually counted
+    in the X-Total-Count-Accuracy header.
+
     Args:
         db (AsyncSession): An asynchronous session for the database.
+        response (Response): The response to set the headers on.
         page (int): The page number to fetch.
         size (int): The number of users to fetch per page.
+        accuracy (CountAccuracy): The way the total number of users is counted.
 
     Returns:
         list[User]: A list of User objects for the specified page and size.
     """
     users = await crud.get_users(db=db, page=page, size=size)
+    total_count = await services.count_users(db=db, accuracy=accuracy)
+    response.headers["X-Total-Count"] = str(total_count.value)
+    response.headers["X-Total-Count-Accuracy"] = total_count.accuracy
     return users
 
 
 @router.get("/{user_id}/", response_model=UserFromDB, status_code=status.HTTP_200_OK)
 async def get_user_detail(
-    db: Annotated[AsyncSession, Depends(get_db)],
+    session_maker: Annotated[async_sessionmaker[AsyncSession], Depends(get_session_maker)],
+    response: Response,
     user_id: Annotated[int, Path(ge=1)],
-) -> User:
+) -> UserFromDB:
     """
     Retrieves a user from the database by its id.
 
+    Identical concurrent requests share one query, run with a session and an admission
+    permit of the first request only. Requests arriving after a write to the user start a new one.
+
     Args:
-        db (Annotated[AsyncSession, Depends(get_db)]): The asynchronous database session.
+        session_maker (async_sessionmaker[AsyncSession]): The factory of database sessions.
+        response (Response): The response to set the ETag header on.
         user_id (Annotated[int, Path(ge=1)]): The id of the user to retrieve.
 
     Returns:
-        User: The User object with the specified id.
+        UserFromDB: The user with the specified id.
     """
-    users = await crud.get_user_by_id(db=db, user_id=user_id)
-    return users
+
+    async def fetch() -> UserFromDB:
+        async with admitted(), session_maker() as db:
+            user = await crud.get_user_by_id(db=db, user_id=user_id)
+            return UserFromDB.model_validate(user)
+
+    user = await user_detail_flight.do(user_id, fetch)
+    set_etag(response, user)
+    return user
 
 
 @router.post("/", response_model=UserFromDB, status_code=status.HTTP_201_CREATED)
-async def create_user(db: Annotated[AsyncSession, Depends(get_db)], user_in: UserCreate) -> User:
+async def create_user(
+    session_maker: Annotated[async_sessionmaker[AsyncSession], Depends(get_session_maker)],
+    response: Response,
+    user_in: UserCreate,
+    idempotency_key: Annotated[str | None, Header(min_length=1, max_length=255)] = None,
+) -> User | JSONResponse:
     """
     Creates a new user in the database.
 
+    Requests sent with an Idempotency-Key header create the user once, retries with
+    the same key get the first response back without touching the users table.
+    With USER_CREATE_BATCH_WINDOW_MS set, concurrent creates are inserted in batches.
+
     Args:
-        db (Annotated[AsyncSession, Depends(get_db)]): The asynchronous database session.
+        session_maker (async_sessionmaker[AsyncSession]): The factory of database sessions,
+            retries waiting for the create with the same key take neither a session nor
+            an admission permit.
+        response (Response): The response to set the ETag header on.
         user_in (UserCreate): A UserCreate object containing the new user's information.
+        idempotency_key (str | None): The key identifying retries of the same request.
 
     Returns:
-        User: The newly created User object.
+        User | JSONResponse: The newly created User object, or the stored response
+        of the request with the same idempotency key.
     """
-    user = await crud.create_user(db=db, user_in=user_in)
-    return user
+
+    async def create(session: AsyncSession) -> User:
+        # Batches are inserted into a single database, they are not used with sharding.
+        if user_create_batcher is None or shards.enabled:
+            return await crud.create_user(db=session, user_in=user_in)
+        return await user_create_batcher.create(session_maker=session_maker, user_in=user_in)
+
+    if idempotency_key is None:
+        async with admitted(), session_maker() as session:
+            user = await create(session)
+        set_etag(response, user)
+        return user
+
+    async def create_once() -> StoredResponse:
+        # The create completes even if this request is cancelled, so it has a session of its own.
+        async with admitted(), session_maker() as session:
+            user = await create(session)
+        return StoredResponse(
+            status_code=status.HTTP_201_CREATED,
+            content=UserFromDB.model_validate(user).model_dump(mode="json"),
+            headers={"ETag": f'"{user.version}"'},
+        )
+
+    return await user_creates.run(idempotency_key, user_in.model_dump_json(), create_once)
 
 
 @router.put("/{user_id}/", response_model=UserFromDB, status_code=status.HTTP_200_OK)
 async def update_user(
     db: Annotated[AsyncSession, Depends(get_db)],
+    response: Response,
     user_id: Annotated[int, Path(ge=1)],
     user_in: UserUpdate,
+    expected_version: Annotated[int | None, Depends(get_if_match_version)],
 ) -> User:
     """
     Updates a user in the database.
 
     Args:
         db (Annotated[AsyncSession, Depends(get_db)]): The asynchronous database session.
+        response (Response): The response to set the ETag header on.
         user_id (Annotated[int, Path(ge=1)]): The id of the user to update.
         user_in (UserUpdate): A UserUpdate object containing the updated user's information.
+        expected_version (int | None): The version from the If-Match header.
+
+    Returns:
+        User: The updated User object.
+    """
+    user = await crud.update_user(
+        db=db, user_id=user_id, user_in=user_in, expected_version=expected_version
+    )
+    user_detail_flight.forget(user_id)
+    set_etag(response, user)
+    return user
+
+
+@router.patch("/{user_id}/", response_model=UserFromDB, status_code=status.HTTP_200_OK)
+async def patch_user(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    response: Response,
+    user_id: Annotated[int, Path(ge=1)],
+    user_in: UserPatch,
+    expected_version: Annotated[int | None, Depends(get_if_match_version)],
+) -> User:
+    """
+    Partially updates a user in the database, only the fields that are sent are changed.
+
+    Args:
+        db (Annotated[AsyncSession, Depends(get_db)]): The asynchronous database session.
+        response (Response): The response to set the ETag header on.
+        user_id (Annotated[int, Path(ge=1)]): The id of the user to update.
+        user_in (UserPatch): A UserPatch object containing the fields to change.
+        expected_version (int | None): The version from the If-Match header.
 
     Returns:
         User: The updated User object.
     """
-    user = await crud.update_user(db=db, user_id=user_id, user_in=user_in)
+    user = await crud.update_user(
+        db=db, user_id=user_id, user_in=user_in, expected_version=expected_version
+    )
+    user_detail_flight.forget(user_id)
+    set_etag(response, user)
     return user
 
 
@@ -133,4 +371,5 @@ async def delete_user(
         user_id (Annotated[int, Path(ge=1)]): The id of the user to delete.
     """
     await crud.delete_user(db=db, user_id=user_id)
+    user_detail_flight.forget(user_id)
     return
@@ -1,7 +1,13 @@
 from datetime import datetime
+from enum import StrEnum
 from typing import Annotated
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field, StringConstraints
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, StringConstraints, model_validator
+
+Username = Annotated[
+    str,
+    StringConstraints(strip_whitespace=True, min_length=2),
+]
 
 
 class UserBase(BaseModel):
@@ -13,10 +19,7 @@ class UserBase(BaseModel):
         email (str): The email of the user.
     """
 
-    username: Annotated[
-        str,
-        StringConstraints(strip_whitespace=True, min_length=2),
-    ]
+    username: Username
     email: EmailStr
 
 
@@ -29,10 +32,12 @@ class UserFromDB(UserBase):
     Attributes:
         id (int): The unique identifier for the user.
         registration (datetime): The date and time when the user was registered.
+        version (int): The version of the user, to send in the If-Match header of updates.
     """
 
     id: int
     registration: datetime
+    version: int
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -53,6 +58,38 @@ class UserUpdate(UserCreate):
     """
 
 
+class CountAccuracy(StrEnum):
+    """
+    An enumeration of the ways users can be counted.
+
+    Exact counts scan the users table, approximate counts come from planner
+    estimates or cached counts that are at most APPROX_COUNT_TTL_SECONDS old.
+    """
+
+    EXACT = "exact"
+    APPROX = "approx"
+
+
+class UserPatch(BaseModel):
+    """
+    A model for partially updating a User, only the fields that are sent are updated.
+
+    Attributes:
+        username (str | None): The new username of the user.
+        email (str | None): The new email of the user.
+    """
+
+    username: Username | None = None
+    email: EmailStr | None = None
+
+    @model_validator(mode="after")
+    def check_not_null(self) -> "UserPatch":
+        for field in self.model_fields_set:
+            if getattr(self, field) is None:
+                raise ValueError(f"{field} must not be null")
+        return self
+
+
 class UserStatistics(BaseModel):
     """
     A model for user statistics.
@@ -64,6 +101,7 @@ class UserStatistics(BaseModel):
              A list of the top five users with the longest names.
         ratio_of_users_with_specific_domain (float):
             The ratio of users with a specific domain to the total number of users.
+        accuracy (CountAccuracy): The way users were counted.
     """
 
     users_registered_seven_days_ago: int = Field(
@@ -71,3 +109,66 @@ class UserStatistics(BaseModel):
     )
     top_five_users_with_longest_names: list[str]
     percent_of_users_with_specific_domain: str
+    accuracy: CountAccuracy = CountAccuracy.EXACT
+
+
+class RegistrationInterval(StrEnum):
+    """
+    An enumeration of the intervals registrations can be bucketed by.
+    """
+
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+
+
+class RegistrationBucket(BaseModel):
+    """
+    A model for the number of users registered within one interval.
+
+    Attributes:
+        bucket (datetime): The start of the interval.
+        count (int): The number of users registered within the interval.
+    """
+
+    bucket: datetime
+    count: int
+
+
+class ChangeOperation(StrEnum):
+    """
+    An enumeration of the kinds of changes in the users change feed.
+    """
+
+    UPSERT = "upsert"
+    DELETE = "delete"
+
+
+class UserChange(BaseModel):
+    """
+    A model for one change in the users change feed.
+
+    Attributes:
+        seq (int): The position of the change in the feed.
+        operation (ChangeOperation): The kind of the change.
+        user_id (int): The id of the changed user.
+        user (UserFromDB | None): The current state of the user, None if it was deleted.
+    """
+
+    seq: int
+    operation: ChangeOperation
+    user_id: int
+    user: UserFromDB | None = None
+
+
+class UserChanges(BaseModel):
+    """
+    A model for a page of the users change feed.
+
+    Attributes:
+        changes (list[UserChange]): The changes after the requested cursor, ordered by seq.
+        next_cursor (int): The cursor to request the following changes with.
+    """
+
+    changes: list[UserChange]
+    next_cursor: int
@@ -1,15 +1,78 @@
+import asyncio
+import heapq
+from collections import Counter
+from collections.abc import AsyncGenerator, Awaitable, Callable
 from datetime import datetime, timedelta
+from typing import NamedTuple
 
-from sqlalchemy import func, select
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from src.users.models import User
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.sharding import shards
+from src.users import crud
+from src.users.models import User, UserRegistrationRollup
+from src.users.schemas import (
+    CountAccuracy,
+    RegistrationBucket,
+    RegistrationInterval,
+    UserStatistics,
+)
+
+MAX_REGISTRATION_BUCKETS = 1000
+
+approximate_counts: TTLCache[int] = TTLCache(ttl=settings.APPROX_COUNT_TTL_SECONDS, max_size=1024)
+
+INTERVAL_STEPS = {
+    RegistrationInterval.HOUR: timedelta(hours=1),
+    RegistrationInterval.DAY: timedelta(days=1),
+    RegistrationInterval.WEEK: timedelta(weeks=1),
+}
+
+
+class UserCount(NamedTuple):
+    """
+    A number of users with the way it was actually counted.
+
+    Attributes:
+        value (int): The number of users.
+        accuracy (CountAccuracy): Exact if the users were counted for this call,
+            approximate if the number is an estimate or was cached.
+    """
+
+    value: int
+    accuracy: CountAccuracy
+
+
+def truncate_to_interval(moment: datetime, interval: RegistrationInterval) -> datetime:
+    """
+    Truncates the moment to the start of its interval, the same way as Postgres date_trunc.
+
+    Args:
+        moment (datetime): The moment to truncate.
+        interval (RegistrationInterval): The interval to truncate to.
+
+    Returns:
+        datetime: The start of the interval containing the moment.
+    """
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if interval == RegistrationInterval.HOUR:
+        return moment
+    moment = moment.replace(hour=0)
+    if interval == RegistrationInterval.DAY:
+        return moment
+    return moment - timedelta(days=moment.weekday())
 
 
 async def count_user_registered_last_seven_days(*, db: AsyncSession) -> int:
     """
     Asynchronously counts the number of users registered in the last seven days.
 
+    Whole hours are summed from the registration rollups, only the partial hour
+    at the start of the window is counted from the users table. Shards are counted concurrently.
+
     Args:
         db (AsyncSession): An asynchronous session for the database.
 
@@ -18,30 +81,196 @@ async def count_user_registered_last_seven_days(*, db: AsyncSession) -> int:
         If no users were registered, returns 0.
     """
     seven_days_ago = datetime.now() - timedelta(days=7)
-    recent_users_count = await db.scalar(
-        select(func.count(User.id)).where(User.registration >= seven_days_ago)
+    partial_hour = truncate_to_interval(seven_days_ago, RegistrationInterval.HOUR)
+    first_whole_hour = partial_hour + timedelta(hours=1)
+
+    async def count_shard_users(session: AsyncSession) -> int:
+        whole_hours_count = await session.scalar(
+            select(func.sum(UserRegistrationRollup.registrations)).where(
+                UserRegistrationRollup.bucket >= first_whole_hour
+            )
+        )
+        partial_hour_count = await session.scalar(
+            select(func.count(User.id)).where(
+                User.registration >= seven_days_ago, User.registration < first_whole_hour
+            )
+        )
+        return (whole_hours_count or 0) + (partial_hour_count or 0)
+
+    return sum(await shards.gather(db, count_shard_users))
+
+
+async def get_registration_series(
+    *, db: AsyncSession, interval: RegistrationInterval, start: datetime, end: datetime
+) -> list[RegistrationBucket]:
+    """
+    Asynchronously counts the users registered within each interval of the given range.
+
+    The counts are summed from the hourly registration rollups, so the range is
+    extended to whole intervals and buckets without registrations are returned as 0.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        interval (RegistrationInterval): The interval to bucket registrations by.
+        start (datetime): The start of the range.
+        end (datetime): The end of the range, exclusive.
+
+    Returns:
+        list[RegistrationBucket]: The number of registrations per interval, ordered by time.
+
+    Raises:
+        HTTPException: If the range is empty or contains too many intervals,
+        a 400 Bad Request exception is raised.
+    """
+    # Registrations are stored as naive local time, like datetime.now().
+    start, end = (
+        moment.astimezone().replace(tzinfo=None) if moment.tzinfo else moment
+        for moment in (start, end)
     )
-    return recent_users_count if recent_users_count else 0
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="The end must be after the start"
+        )
+    step = INTERVAL_STEPS[interval]
+    first_bucket = truncate_to_interval(start, interval)
+    if (end - first_bucket) / step > MAX_REGISTRATION_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The range must not contain more than {MAX_REGISTRATION_BUCKETS} {interval}s",
+        )
+
+    # The interval is rendered inline, so that the select and group by expressions match.
+    bucket = func.date_trunc(
+        literal_column(f"'{interval.value}'"), UserRegistrationRollup.bucket
+    ).label("bucket")
+
+    async def count_shard_registrations(session: AsyncSession) -> dict[datetime, int]:
+        rows = await session.execute(
+            select(bucket, func.sum(UserRegistrationRollup.registrations))
+            .where(
+                UserRegistrationRollup.bucket >= first_bucket, UserRegistrationRollup.bucket < end
+            )
+            .group_by(bucket)
+        )
+        return dict(rows.tuples().all())
+
+    counts: Counter[datetime] = Counter()
+    for shard_counts in await shards.gather(db, count_shard_registrations):
+        counts.update(shard_counts)
+
+    series = []
+    current = first_bucket
+    while current < end:
+        series.append(RegistrationBucket(bucket=current, count=counts.get(current, 0)))
+        current += step
+    return series
+
+
+async def count_users(*, db: AsyncSession, accuracy: CountAccuracy) -> UserCount:
+    """
+    Asynchronously counts the users.
+
+    Approximate counts use the planner estimates of the users tables, or an exact count
+    if a table has not been analyzed yet, and are cached. Shards are counted concurrently.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        accuracy (CountAccuracy): The way users are counted.
+
+    Returns:
+        UserCount: The number of users and the way it was actually counted.
+    """
+
+    async def count_shard_users(session: AsyncSession) -> int:
+        return await session.scalar(select(func.count(User.id))) or 0
+
+    async def estimate_shard_users(session: AsyncSession) -> int | None:
+        estimate: int | None = await session.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {"table": User.__tablename__},
+        )
+        return estimate
+
+    if accuracy == CountAccuracy.EXACT:
+        return UserCount(sum(await shards.gather(db, count_shard_users)), CountAccuracy.EXACT)
+
+    cached_count = approximate_counts.get("users")
+    if cached_count is not None:
+        return UserCount(cached_count, CountAccuracy.APPROX)
+    estimates = await shards.gather(db, estimate_shard_users)
+    # Postgres reports -1 for tables that have never been vacuumed or analyzed.
+    if any(estimate is None or estimate < 0 for estimate in estimates):
+        users_count = await count_users(db=db, accuracy=CountAccuracy.EXACT)
+    else:
+        users_count = UserCount(
+            sum(int(estimate or 0) for estimate in estimates), CountAccuracy.APPROX
+        )
+    approximate_counts.set("users", users_count.value)
+    return users_count
+
+
+async def count_users_with_domain(
+    *, db: AsyncSession, domain: str, accuracy: CountAccuracy
+) -> UserCount:
+    """
+    Asynchronously counts the users with the specified domain in their email address.
+
+    Approximate counts are cached exact counts. Shards are counted concurrently.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        domain (str): The domain to filter users by.
+        accuracy (CountAccuracy): The way users are counted.
+
+    Returns:
+        UserCount: The number of users with the specified domain and the way it was
+        actually counted.
+    """
+    if accuracy == CountAccuracy.APPROX:
+        cached_count = approximate_counts.get(("domain", domain))
+        if cached_count is not None:
+            return UserCount(cached_count, CountAccuracy.APPROX)
+
+    async def count_shard_users(session: AsyncSession) -> int:
+        statement = select(func.count(User.id)).where(User.email.like(f"%@{domain}"))
+        return await session.scalar(statement) or 0
+
+    domain_count = sum(await shards.gather(db, count_shard_users))
+    if accuracy == CountAccuracy.APPROX:
+        approximate_counts.set(("domain", domain), domain_count)
+    return UserCount(domain_count, CountAccuracy.EXACT)
 
 
 async def top_five_users_with_longest_names(*, db: AsyncSession) -> list[str]:
     """
     Asynchronously retrieves the usernames of the top five users with the longest names.
 
+    The top five of every shard are fetched concurrently and merged.
+
     Args:
         db (AsyncSession): An asynchronous session for the database.
 
     Returns:
         list[str]: A list of usernames of the top five users with the longest names.
     """
-    users = await db.scalars(
-        select(User).order_by(func.length(User.username).desc(), User.username).limit(5)
-    )
-    usernames = [user.username for user in users.all()]
+
+    async def fetch_shard_usernames(session: AsyncSession) -> list[str]:
+        usernames = await session.scalars(
+            select(User.username)
+            .order_by(func.length(User.username).desc(), User.username)
+            .limit(5)
+        )
+        return list(usernames.all())
+
+    shard_usernames = await shards.gather(db, fetch_shard_usernames)
+    merged = heapq.merge(*shard_usernames, key=lambda username: (-len(username), username))
+    usernames = list(merged)[:5]
     return usernames
 
 
-async def percentage_users_with_specific_domain(*, db: AsyncSession, domain: str | None) -> str:
+async def percentage_users_with_specific_domain(
+    *, db: AsyncSession, domain: str | None, accuracy: CountAccuracy = CountAccuracy.EXACT
+) -> tuple[str, CountAccuracy]:
     """
     Asynchronously calculates the percentage of users with the specified domain
         in their email address.
@@ -49,16 +278,91 @@ async def percentage_users_with_specific_domain(*, db: AsyncSession, domain: str
     Args:
         db (AsyncSession): An asynchronous session for the database.
         domain (str): The domain to filter users by.
+        accuracy (CountAccuracy): The way users are counted.
 
     Returns:
-        str: The percentage of users with the specified domain in their email address,
-        or "0%" if no users were found.
+        tuple[str, CountAccuracy]: The percentage of users with the specified domain in their
+        email address, or "0%" if no users were found, and whether it is exact, which it is
+        only if both counts were made for this call.
     """
-    if domain is not None:
-        total_users_count = await db.scalar(select(func.count(User.id)))
-        count_users_with_specific_domain = await db.scalar(
-            select(func.count(User.id)).where(User.email.like(f"%@{domain}"))
-        )
-        if total_users_count and count_users_with_specific_domain:
-            return f"{round(count_users_with_specific_domain / total_users_count * 100, 2)}%"
-    return "0%"
+    if domain is None:
+        return "0%", CountAccuracy.EXACT
+    total_users_count = await count_users(db=db, accuracy=accuracy)
+    count_users_with_specific_domain = await count_users_with_domain(
+        db=db, domain=domain, accuracy=accuracy
+    )
+    accuracies = {total_users_count.accuracy, count_users_with_specific_domain.accuracy}
+    used_accuracy = (
+        CountAccuracy.APPROX if CountAccuracy.APPROX in accuracies else CountAccuracy.EXACT
+    )
+    if not total_users_count.value or not count_users_with_specific_domain.value:
+        return "0%", used_accuracy
+    # Estimates may lag behind, a percentage above 100 is never reported.
+    ratio = min(count_users_with_specific_domain.value / total_users_count.value, 1)
+    return f"{round(ratio * 100, 2)}%", used_accuracy
+
+
+async def get_user_statistics(
+    *, db: AsyncSession, domain: str | None, accuracy: CountAccuracy = CountAccuracy.EXACT
+) -> UserStatistics:
+    """
+    Asynchronously collects all user statistics.
+
+    Args:
+        db (AsyncSession): An asynchronous session for the database.
+        domain (str): The domain to filter users by.
+        accuracy (CountAccuracy): The way users are counted.
+
+    Returns:
+        UserStatistics: A UserStatistics object containing the user statistics,
+        with the accuracy the counts were actually made with.
+    """
+    percentage, used_accuracy = await percentage_users_with_specific_domain(
+        db=db, domain=domain, accuracy=accuracy
+    )
+    return UserStatistics(
+        users_registered_seven_days_ago=await count_user_registered_last_seven_days(db=db),
+        top_five_users_with_longest_names=await top_five_users_with_longest_names(db=db),
+        percent_of_users_with_specific_domain=percentage,
+        accuracy=used_accuracy,
+    )
+
+
+async def stream_user_changes(
+    *,
+    session_maker: async_sessionmaker[AsyncSession],
+    since: int,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    shard: int | None = None,
+    poll_interval: float = settings.CHANGE_FEED_POLL_INTERVAL_SECONDS,
+    page_size: int = 100,
+) -> AsyncGenerator[str, None]:
+    """
+    Asynchronously streams the changes of users after the given cursor as Server-Sent Events.
+
+    The feed is polled with a short-lived session per poll, so an idle stream holds
+    no database connection. A comment is sent on idle polls to detect disconnected clients.
+
+    Args:
+        session_maker (async_sessionmaker[AsyncSession]): The factory of database sessions.
+        since (int): The cursor to start streaming after.
+        is_disconnected (Callable[[], Awaitable[bool]]): A callable telling whether
+            the client has disconnected.
+        shard (int | None): The index of the shard to stream, required with sharding.
+        poll_interval (float): The number of seconds to wait between idle polls.
+        page_size (int): The maximum number of changes to fetch per poll.
+
+    Yields:
+        str: Server-Sent Events, one per change, with the cursor as the event id.
+    """
+    cursor = since
+    while not await is_disconnected():
+        async with session_maker() as db:
+            page = await crud.get_user_changes(db=db, since=cursor, limit=page_size, shard=shard)
+        for change in page.changes:
+            data = change.model_dump_json()
+            yield f"id: {change.seq}\nevent: {change.operation}\ndata: {data}\n\n"
+        cursor = page.next_cursor
+        if len(page.changes) < page_size:
+            yield ": keep-alive\n\n"
+            await asyncio.sleep(poll_interval)
@@ -6,11 +6,13 @@ from httpx import ASGITransport, AsyncClient
 from sqlalchemy import NullPool
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+from src.core.admission import admitted
 from src.core.config import settings
 from src.core.db import BaseORM
-from src.deps import get_db
+from src.deps import get_db, get_session_maker
 from src.main import app
 from src.users.models import User
+from src.users.services import approximate_counts
 from src.utils import get_random_lower_string
 
 engine_test = create_async_engine(
@@ -25,15 +27,17 @@ async_session_maker = async_sessionmaker(
 
 
 async def override_get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
+    async with admitted(), async_session_maker() as session:
         yield session
 
 
 app.dependency_overrides[get_db] = override_get_async_session
+app.dependency_overrides[get_session_maker] = lambda: async_session_maker
 
 
 @pytest.fixture(autouse=True, scope="function")
 async def prepare_database() -> AsyncGenerator[None, None]:
+    approximate_counts.clear()
     async with engine_test.begin() as conn:
         await conn.run_sync(BaseORM.metadata.create_all)
     yield
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from src.core.admission import (
+    AdmissionControlMiddleware,
+    ConcurrencyLimiter,
+    Overloaded,
+    admitted,
+    get_route_group,
+)
+from src.main import app as main_app
+from src.users import services
+from src.users.schemas import CountAccuracy, UserStatistics
+
+
+async def test_limiter_sheds_when_queue_is_full() -> None:
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=0, max_wait=1)
+    await limiter.acquire()
+
+    with pytest.raises(Overloaded):
+        await limiter.acquire()
+    limiter.release()
+
+
+async def test_limiter_sheds_after_max_wait() -> None:
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, max_wait=0.01)
+    await limiter.acquire()
+
+    with pytest.raises(Overloaded):
+        await limiter.acquire()
+    limiter.release()
+
+
+async def test_limiter_admits_queued_request_after_release() -> None:
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, max_wait=1)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    limiter.release()
+
+    await waiter
+    limiter.release()
+
+
+@pytest.mark.parametrize(argnames="steps", argvalues=[0, 1])
+async def test_limiter_keeps_permit_of_request_cancelled_as_it_is_admitted(steps: int) -> None:
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, max_wait=1)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    limiter.release()
+    for _ in range(steps):
+        await asyncio.sleep(0)
+    waiter.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    await asyncio.wait_for(limiter.acquire(), 0.1)
+    limiter.release()
+
+
+@pytest.mark.parametrize(
+    argnames="method,path,group",
+    argvalues=[
+        ("GET", "/api/v1/users/statistics/", "statistics"),
+        ("GET", "/api/v1/users/registrations/", "statistics"),
+        ("GET", "/api/v1/users/1/", "read"),
+        ("POST", "/api/v1/users/", "write"),
+        ("GET", "/api/v1/users/changes/stream/", None),
+        ("GET", "/api/v1/metrics/", None),
+        ("GET", "/docs", None),
+    ],
+)
+def test_route_group(method: str, path: str, group: str | None) -> None:
+    assert get_route_group(method, path) == group
+
+
+async def test_middleware_sheds_with_retry_after() -> None:
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.get("/api/v1/users/statistics/")
+    async def slow_statistics() -> dict[str, str]:
+        async with admitted():
+            await release.wait()
+        return {}
+
+    @app.get("/api/v1/users/1/")
+    async def user_detail() -> dict[str, str]:
+        return {}
+
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        budgets={"statistics": 1, "read": 1},
+        max_queue=0,
+        max_wait=1,
+        retry_after=3,
+    )
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/api/v1/users/statistics/"))
+        await asyncio.sleep(0.05)
+        shed = await client.get("/api/v1/users/statistics/")
+        detail = await client.get("/api/v1/users/1/")
+        release.set()
+        first_response = await first
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "3"
+    assert detail.status_code == 200
+    assert first_response.status_code == 200
+
+
+async def test_app_admits_burst_of_identical_requests_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = 0
+
+    async def slow_statistics(**kwargs: object) -> UserStatistics:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.3)
+        return UserStatistics(
+            users_registered_seven_days_ago=1,
+            top_five_users_with_longest_names=[],
+            percent_of_users_with_specific_domain="0%",
+            accuracy=CountAccuracy.EXACT,
+        )
+
+    monkeypatch.setattr(services, "get_user_statistics", slow_statistics)
+    async with AsyncClient(transport=ASGITransport(app=main_app), base_url="http://test") as client:
+        responses = await asyncio.gather(
+            *(
+                client.get("/api/v1/users/statistics/", params={"domain": "gmail.com"})
+                for _ in range(200)
+            )
+        )
+
+    assert [response.status_code for response in responses] == [200] * 200
+    assert calls == 1
@@ -0,0 +1,30 @@
+import time
+
+from src.core.cache import TTLCache
+
+
+def test_cache_returns_stored_value() -> None:
+    cache: TTLCache[int] = TTLCache(ttl=60, max_size=10)
+    cache.set("key", 1)
+
+    assert cache.get("key") == 1
+    assert cache.get("missing") is None
+
+
+def test_cache_expires_entries() -> None:
+    cache: TTLCache[int] = TTLCache(ttl=0.01, max_size=10)
+    cache.set("key", 1)
+    time.sleep(0.02)
+
+    assert cache.get("key") is None
+
+
+def test_cache_evicts_oldest_entry() -> None:
+    cache: TTLCache[int] = TTLCache(ttl=60, max_size=2)
+    cache.set("first", 1)
+    cache.set("second", 2)
+    cache.set("third", 3)
+
+    assert cache.get("first") is None
+    assert cache.get("second") == 2
+    assert cache.get("third") == 3
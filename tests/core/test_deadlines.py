@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from asyncpg.exceptions import QueryCanceledError
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.exc import DBAPIError
+from starlette.types import Message
+
+from src.core.deadlines import DeadlineMiddleware, request_deadline
+
+
+def database_error(cause: Exception) -> DBAPIError:
+    orig = Exception(str(cause))
+    orig.__cause__ = cause
+    return DBAPIError("SELECT 1", None, orig)
+
+
+def create_app(cancelled: asyncio.Event, statistics_deadline: float = 0.05) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/users/statistics/")
+    async def slow_statistics() -> dict[str, str]:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return {}
+
+    @app.get("/api/v1/users/1/")
+    async def user_detail() -> dict[str, bool]:
+        return {"has_deadline": request_deadline.get() is not None}
+
+    @app.get("/api/v1/users/2/")
+    async def timed_out_query() -> None:
+        raise database_error(QueryCanceledError("canceling statement due to statement timeout"))
+
+    @app.get("/api/v1/users/3/")
+    async def failed_query() -> None:
+        raise database_error(ValueError("invalid input"))
+
+    app.add_middleware(DeadlineMiddleware, deadlines={"statistics": statistics_deadline, "read": 1})
+    return app
+
+
+async def test_request_within_deadline() -> None:
+    app = create_app(asyncio.Event())
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/v1/users/1/")
+
+    assert response.status_code == 200
+    assert response.json() == {"has_deadline": True}
+
+
+async def test_request_over_deadline_is_cancelled() -> None:
+    cancelled = asyncio.Event()
+    app = create_app(cancelled)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/v1/users/statistics/")
+
+    assert response.status_code == 504
+    assert cancelled.is_set()
+
+
+async def test_request_is_cancelled_on_client_disconnect() -> None:
+    cancelled = asyncio.Event()
+    app = create_app(cancelled, statistics_deadline=10)
+    messages: list[Message] = [
+        {"type": "http.request", "body": b"", "more_body": False},
+        {"type": "http.disconnect"},
+    ]
+    sent: list[Message] = []
+
+    async def receive() -> Message:
+        await asyncio.sleep(0.01)
+        return messages.pop(0)
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/v1/users/statistics/",
+        "raw_path": b"/api/v1/users/statistics/",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [],
+        "server": ("test", 80),
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=1)
+
+    assert cancelled.is_set()
+    assert sent == []
+
+
+async def test_query_cancelled_by_statement_timeout_is_answered_with_504() -> None:
+    app = create_app(asyncio.Event())
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/v1/users/2/")
+
+    assert response.status_code == 504
+
+
+async def test_other_database_errors_are_not_answered_with_504() -> None:
+    app = create_app(asyncio.Event())
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        with pytest.raises(DBAPIError):
+            await client.get("/api/v1/users/3/")
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from src.core.deadlines import request_deadline
+from src.core.idempotency import IdempotencyStore, StoredResponse
+
+
+async def test_concurrent_retries_share_the_first_response() -> None:
+    store = IdempotencyStore("test_idempotency", ttl=60, max_size=10)
+    calls = 0
+
+    async def create() -> StoredResponse:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return StoredResponse(status_code=201, content={"id": calls})
+
+    responses = await asyncio.gather(*(store.run("key", "body", create) for _ in range(5)))
+    replay = await store.run("key", "body", create)
+
+    assert calls == 1
+    assert {response.body for response in [*responses, replay]} == {b'{"id":1}'}
+    assert [response.headers.get("Idempotent-Replayed") for response in responses].count(None) == 1
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_client_errors_are_stored_and_server_errors_are_not() -> None:
+    store = IdempotencyStore("test_idempotency", ttl=60, max_size=10)
+
+    async def conflict() -> StoredResponse:
+        raise HTTPException(status_code=400, detail="already exists")
+
+    async def failure() -> StoredResponse:
+        raise HTTPException(status_code=503, detail="unavailable")
+
+    async def create() -> StoredResponse:
+        return StoredResponse(status_code=201, content={})
+
+    await store.run("conflict", "body", conflict)
+    response = await store.run("conflict", "body", create)
+    with pytest.raises(HTTPException):
+        await store.run("failure", "body", failure)
+    retry = await store.run("failure", "body", create)
+
+    assert response.status_code == 400
+    assert response.body == b'{"detail":"already exists"}'
+    assert retry.status_code == 201
+
+
+async def test_reused_key_with_different_body_is_rejected() -> None:
+    store = IdempotencyStore("test_idempotency", ttl=60, max_size=10)
+
+    async def create() -> StoredResponse:
+        return StoredResponse(status_code=201, content={})
+
+    await store.run("key", "body", create)
+    with pytest.raises(HTTPException) as exc_info:
+        await store.run("key", "other body", create)
+
+    assert exc_info.value.status_code == 422
+
+
+async def test_request_completes_for_retries_when_first_caller_is_cancelled() -> None:
+    store = IdempotencyStore("test_idempotency", ttl=60, max_size=10)
+    calls = 0
+
+    async def create() -> StoredResponse:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return StoredResponse(status_code=201, content={"id": calls})
+
+    first = asyncio.create_task(store.run("key", "body", create))
+    await asyncio.sleep(0)
+    retry = asyncio.create_task(store.run("key", "body", create))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    response = await retry
+
+    assert calls == 1
+    assert response.status_code == 201
+    assert response.body == b'{"id":1}'
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_request_is_not_bounded_by_the_deadline_of_the_first_caller() -> None:
+    store = IdempotencyStore("test_idempotency", ttl=60, max_size=10)
+    deadlines = []
+
+    async def create() -> StoredResponse:
+        deadlines.append(request_deadline.get())
+        return StoredResponse(status_code=201, content={})
+
+    token = request_deadline.set(time.monotonic())
+    try:
+        await store.run("key", "body", create)
+    finally:
+        request_deadline.reset(token)
+
+    assert deadlines == [None]
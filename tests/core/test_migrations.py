@@ -0,0 +1,142 @@
+import time
+from collections.abc import Callable
+from functools import partial
+
+import pytest
+from alembic.config import Config
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import Connection, delete, func, literal_column, select, text
+
+from src.core.migrations import (
+    backfill_in_batches,
+    create_index_concurrently,
+    drop_index_concurrently,
+    execute_in_batches,
+)
+from src.users.models import User, UserRegistrationRollup
+from tests.conftest import async_session_maker, engine_test
+
+
+class Interrupted(Exception):
+    pass
+
+
+async def run_revision(upgrade: Callable[[], None]) -> None:
+    def run(connection: Connection) -> None:
+        context = MigrationContext.configure(connection)
+        with Operations.context(context), context.begin_transaction():
+            upgrade()
+
+    async with engine_test.connect() as connection:
+        await connection.run_sync(run)
+
+
+async def test_backfill_covers_every_batch(create_list_users: tuple[User, ...]) -> None:
+    async with async_session_maker() as db:
+        await db.execute(text("UPDATE users SET username = upper(username) WHERE id = 3"))
+        await db.commit()
+
+    await run_revision(
+        lambda: backfill_in_batches(
+            "users",
+            set_clause="username = upper(username)",
+            pending="username <> upper(username)",
+            batch_size=10,
+            pause=0,
+        )
+    )
+
+    async with async_session_maker() as db:
+        pending = await db.scalar(
+            select(func.count(User.id)).where(User.username != func.upper(User.username))
+        )
+    assert pending == 0
+
+
+async def test_batches_add_up_across_boundaries(create_list_users: tuple[User, ...]) -> None:
+    async with async_session_maker() as db:
+        await db.execute(text("DELETE FROM user_registration_rollups"))
+        await db.commit()
+
+    await run_revision(
+        lambda: execute_in_batches(
+            "users",
+            """
+            INSERT INTO user_registration_rollups (bucket, registrations)
+            SELECT date_trunc('hour', registration), count(*)
+            FROM users
+            WHERE id >= :start AND id < :end
+            GROUP BY 1
+            ON CONFLICT (bucket) DO UPDATE
+            SET registrations = user_registration_rollups.registrations + excluded.registrations
+            """,
+            batch_size=4,
+            pause=0,
+        )
+    )
+
+    async with async_session_maker() as db:
+        registrations = await db.scalar(select(func.sum(UserRegistrationRollup.registrations)))
+    assert registrations == 25
+
+
+async def test_index_helpers_run_outside_of_the_revision_transaction() -> None:
+    index_is_valid = text(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass('ix_users_test')"
+    )
+
+    # CREATE and DROP INDEX CONCURRENTLY fail within a transaction block.
+    await run_revision(lambda: create_index_concurrently("ix_users_test", "users", ["email"]))
+    async with async_session_maker() as db:
+        assert await db.scalar(index_is_valid) is True
+
+    await run_revision(lambda: drop_index_concurrently("ix_users_test", "users"))
+    async with async_session_maker() as db:
+        assert await db.scalar(index_is_valid) is None
+
+
+async def test_interrupted_rollup_backfill_resumes_and_counts_every_user_once(
+    create_list_users: tuple[User, ...], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    revision = ScriptDirectory.from_config(Config("alembic.ini")).get_revision("3f1c9a7b2d84")
+    assert revision is not None
+    monkeypatch.setattr(
+        revision.module,
+        "execute_in_batches",
+        partial(execute_in_batches, batch_size=4, pause=0),
+    )
+    async with async_session_maker() as db:
+        await db.execute(text("DELETE FROM user_registration_rollups"))
+        await db.commit()
+
+    def interrupt(seconds: float) -> None:
+        raise Interrupted
+
+    # The run stops after its first batch is committed.
+    monkeypatch.setattr(time, "sleep", interrupt)
+    with pytest.raises(Interrupted):
+        await run_revision(revision.module.upgrade)
+    async with async_session_maker() as db:
+        assert await db.scalar(select(func.sum(UserRegistrationRollup.registrations))) == 4
+
+    # Writes between the runs are counted once, including the deletion of a user
+    # not counted yet from a bucket the first batch has already counted.
+    async with async_session_maker() as db:
+        await db.execute(delete(User).where(User.id == create_list_users[4].id))
+        db.add(User(username="registered_late", email="registered_late@example.com"))
+        await db.commit()
+
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    await run_revision(revision.module.upgrade)
+
+    bucket = func.date_trunc(literal_column("'hour'"), User.registration)
+    async with async_session_maker() as db:
+        expected = (await db.execute(select(bucket, func.count()).group_by(bucket))).all()
+        rollups = (
+            await db.execute(
+                select(UserRegistrationRollup.bucket, UserRegistrationRollup.registrations)
+            )
+        ).all()
+    assert sorted(rollups) == sorted(expected)
@@ -0,0 +1,111 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import create_engine, text
+
+from src.core.config import settings
+from src.core.profiling import ProfilingMiddleware
+
+
+def create_app(directory: Path, sample_rate: float = 0, max_profiles: int = 10) -> FastAPI:
+    app = FastAPI()
+    engine = create_engine("sqlite://")
+
+    @app.get("/users/")
+    async def get_users() -> dict[str, int]:
+        with engine.connect() as connection:
+            return {"users": connection.execute(text("SELECT 1")).scalar_one()}
+
+    @app.get("/api/v1/profiles/{profile_id}/pstats")
+    async def get_profile(profile_id: str) -> dict[str, str]:
+        return {}
+
+    app.add_middleware(
+        ProfilingMiddleware,
+        secret="secret",
+        sample_rate=sample_rate,
+        directory=str(directory),
+        max_profiles=max_profiles,
+    )
+    return app
+
+
+async def test_request_with_secret_is_profiled(tmp_path: Path) -> None:
+    app = create_app(tmp_path)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/users/", headers={"X-Profile": "secret"})
+    profile_id = response.headers["X-Profile-Id"]
+    summary = json.loads((tmp_path / f"{profile_id}.sql.json").read_text())
+    speedscope = json.loads((tmp_path / f"{profile_id}.speedscope.json").read_text())
+
+    assert response.status_code == 200
+    assert (tmp_path / f"{profile_id}.pstats").is_file()
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    assert any(frame["name"] == "get_users" for frame in speedscope["shared"]["frames"])
+    assert summary["path"] == "/users/"
+    assert summary["statements"][0]["statement"] == "SELECT 1"
+
+
+async def test_request_without_secret_is_not_profiled(tmp_path: Path) -> None:
+    app = create_app(tmp_path)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/users/", headers={"X-Profile": "wrong"})
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_profile_download_is_not_profiled(tmp_path: Path) -> None:
+    app = create_app(tmp_path, sample_rate=1)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/v1/profiles/1/pstats", headers={"X-Profile": "secret"})
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_sampled_request_is_profiled(tmp_path: Path) -> None:
+    app = create_app(tmp_path, sample_rate=1)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/users/")
+
+    assert "X-Profile-Id" in response.headers
+
+
+async def test_only_the_most_recent_profiles_are_kept(tmp_path: Path) -> None:
+    app = create_app(tmp_path, sample_rate=1, max_profiles=2)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        profile_ids = [(await client.get("/users/")).headers["X-Profile-Id"] for _ in range(3)]
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        f"{profile_id}.{suffix}"
+        for profile_id in profile_ids[1:]
+        for suffix in ("pstats", "speedscope.json", "sql.json")
+    )
+
+
+async def test_successfully_download_profile(
+    async_client: AsyncClient, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "PROFILING_SECRET", "secret")
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+    profile_id = "0" * 32
+    (tmp_path / f"{profile_id}.sql.json").write_text('{"statements": []}')
+
+    response = await async_client.get(
+        f"/profiles/{profile_id}/sql.json", headers={"X-Profile": "secret"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"statements": []}
+
+
+async def test_not_successfully_download_profile_without_secret(async_client: AsyncClient) -> None:
+    response = await async_client.get(f"/profiles/{'0' * 32}/pstats")
+
+    assert response.status_code == 404
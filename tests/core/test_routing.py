@@ -0,0 +1,41 @@
+from collections.abc import AsyncGenerator
+from typing import Annotated, Any
+from unittest.mock import create_autospec
+
+from fastapi import APIRouter, Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from pydantic import BaseModel, model_validator
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.routing import SessionReleasingRoute
+
+
+async def test_session_is_closed_before_the_response_is_serialized() -> None:
+    session = create_autospec(AsyncSession, instance=True)
+    closed_at_serialization = []
+
+    class Payload(BaseModel):
+        value: int
+
+        @model_validator(mode="before")
+        @classmethod
+        def record_session_state(cls, data: Any) -> Any:
+            closed_at_serialization.append(session.close.await_count)
+            return data
+
+    async def get_session() -> AsyncGenerator[AsyncSession, None]:
+        yield session
+
+    router = APIRouter(route_class=SessionReleasingRoute)
+
+    @router.get("/payload/", response_model=Payload)
+    async def get_payload(db: Annotated[AsyncSession, Depends(get_session)]) -> dict[str, int]:
+        return {"value": 1}
+
+    app = FastAPI()
+    app.include_router(router)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/payload/")
+
+    assert response.json() == {"value": 1}
+    assert closed_at_serialization == [1]
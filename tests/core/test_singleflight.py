@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from src.core.metrics import metrics
+from src.core.singleflight import SingleFlight
+from src.users import crud
+from src.users.models import User
+
+
+async def test_concurrent_identical_calls_are_coalesced() -> None:
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def fetch() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return 42
+
+    coalesced_before = metrics.snapshot().get("test_coalesced", 0)
+    results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(10)))
+
+    assert results == [42] * 10
+    assert calls == 1
+    assert metrics.snapshot()["test_coalesced"] - coalesced_before == 9
+
+
+async def test_different_keys_are_not_coalesced() -> None:
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def fetch() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    await asyncio.gather(flight.do("first", fetch), flight.do("second", fetch))
+
+    assert calls == 2
+
+
+async def test_exception_is_shared_by_waiters() -> None:
+    flight = SingleFlight("test")
+
+    async def fetch() -> int:
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    results = await asyncio.gather(
+        *(flight.do("key", fetch) for _ in range(3)), return_exceptions=True
+    )
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_waiter_takes_over_cancelled_call() -> None:
+    flight = SingleFlight("test")
+
+    async def fetch() -> int:
+        await asyncio.sleep(0.05)
+        return 42
+
+    leader = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert await waiter == 42
+
+
+async def test_waiters_get_copies_of_the_result() -> None:
+    flight = SingleFlight("test")
+
+    async def fetch() -> dict[str, int]:
+        await asyncio.sleep(0.01)
+        return {"version": 1}
+
+    leader, waiter = await asyncio.gather(flight.do("key", fetch), flight.do("key", fetch))
+    waiter["version"] = 2
+
+    assert leader == {"version": 1}
+
+
+async def test_forgotten_call_is_not_joined() -> None:
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def fetch() -> int:
+        nonlocal calls
+        calls += 1
+        call = calls
+        await asyncio.sleep(0.05)
+        return call
+
+    leader = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    flight.forget("key")
+
+    assert await flight.do("key", fetch) == 2
+    assert await leader == 1
+    assert await flight.do("key", fetch) == 3
+
+
+async def test_metrics(
+    async_client: AsyncClient,
+    create_list_users: tuple[User, ...],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    get_user_by_id = crud.get_user_by_id
+
+    async def slow_get_user_by_id(**kwargs: object) -> User:
+        await asyncio.sleep(0.05)
+        return await get_user_by_id(**kwargs)  # type: ignore[arg-type]
+
+    monkeypatch.setattr(crud, "get_user_by_id", slow_get_user_by_id)
+    before = (await async_client.get("/metrics/")).json()
+    user_id = create_list_users[0].id
+    responses = await asyncio.gather(*(async_client.get(f"/users/{user_id}/") for _ in range(5)))
+    response = await async_client.get("/metrics/")
+    after = response.json()
+
+    assert response.status_code == 200
+    assert all(user_response.status_code == 200 for user_response in responses)
+    assert after["users_detail_executed"] - before.get("users_detail_executed", 0) == 1
+    assert after["users_detail_coalesced"] - before.get("users_detail_coalesced", 0) == 4
@@ -0,0 +1,200 @@
+from datetime import timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select, update
+
+from src.jobs.models import Job
+from src.jobs.schemas import JobStatus
+from src.jobs.worker import run_next_job
+from src.users.models import User, UserRegistrationRollup
+from tests.conftest import async_session_maker
+
+
+async def submit_statistics_job(async_client: AsyncClient) -> int:
+    response = await async_client.post("/jobs/", json={"kind": "users.statistics", "params": {}})
+    return int(response.json()["id"])
+
+
+async def abandon_job(job_id: int, attempts: int) -> None:
+    async with async_session_maker() as db:
+        await db.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(
+                status=JobStatus.RUNNING,
+                attempts=attempts,
+                heartbeat_at=func.now() - timedelta(minutes=5),
+            )
+        )
+        await db.commit()
+
+
+async def test_successfully_run_import_job(async_client: AsyncClient) -> None:
+    users = [
+        {"username": f"user{number}", "email": f"user{number}@example.com"} for number in range(3)
+    ]
+    users.append({"username": "user0", "email": "other@example.com"})
+    response = await async_client.post(
+        "/jobs/", json={"kind": "users.import", "params": {"users": users}}
+    )
+    job_id = response.json()["id"]
+
+    assert response.status_code == 202
+    assert response.json()["status"] == "pending"
+
+    assert await run_next_job(session_maker=async_session_maker, stale_after=60)
+    assert not await run_next_job(session_maker=async_session_maker, stale_after=60)
+
+    response = await async_client.get(f"/jobs/{job_id}/")
+    json_response_data = response.json()
+
+    assert response.status_code == 200
+    assert json_response_data["status"] == "succeeded"
+    assert json_response_data["progress"] == 100
+    assert json_response_data["result"] == {"created": 3, "skipped": 1}
+    response = await async_client.get("/users/")
+    assert len(response.json()) == 3
+
+
+async def test_import_job_skips_existing_users(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    existing_user = create_list_users[0]
+    users = [
+        {"username": "new_user", "email": existing_user.email},
+        {"username": existing_user.username, "email": "new@example.com"},
+        {"username": "other_user", "email": "other@example.com"},
+    ]
+    response = await async_client.post(
+        "/jobs/", json={"kind": "users.import", "params": {"users": users}}
+    )
+    job_id = response.json()["id"]
+    await run_next_job(session_maker=async_session_maker, stale_after=60)
+
+    response = await async_client.get(f"/jobs/{job_id}/")
+
+    assert response.json()["result"] == {"created": 1, "skipped": 2}
+
+
+async def test_successfully_run_purge_job(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    response = await async_client.post(
+        "/jobs/", json={"kind": "users.purge", "params": {"domain": "gmail.com"}}
+    )
+    job_id = response.json()["id"]
+    await run_next_job(session_maker=async_session_maker, stale_after=60)
+
+    response = await async_client.get(f"/jobs/{job_id}/")
+
+    assert response.json()["result"] == {"deleted": 7}
+    response = await async_client.get("/users/statistics/?domain=gmail.com")
+    assert response.json()["count_users_registered_seven_days_ago"] == 13
+    assert response.json()["percent_of_users_with_specific_domain"] == "0%"
+    response = await async_client.get("/users/changes/?limit=1000")
+    operations = [change["operation"] for change in response.json()["changes"]]
+    assert operations.count("delete") == 7
+
+
+async def test_successfully_run_statistics_job(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    response = await async_client.post(
+        "/jobs/", json={"kind": "users.statistics", "params": {"domain": "yandex.ru"}}
+    )
+    job_id = response.json()["id"]
+    await run_next_job(session_maker=async_session_maker, stale_after=60)
+
+    response = await async_client.get(f"/jobs/{job_id}/")
+    result = response.json()["result"]
+
+    assert result["count_users_registered_seven_days_ago"] == 20
+    assert result["percent_of_users_with_specific_domain"] == "20.0%"
+
+
+async def test_statistics_job_rebuilds_recent_rollups_only(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    async with async_session_maker() as db:
+        await db.execute(update(UserRegistrationRollup).values(registrations=0))
+        await db.commit()
+    response = await async_client.post(
+        "/jobs/", json={"kind": "users.statistics", "params": {"hours": 24}}
+    )
+    job_id = response.json()["id"]
+    await run_next_job(session_maker=async_session_maker, stale_after=60)
+
+    response = await async_client.get(f"/jobs/{job_id}/")
+    async with async_session_maker() as db:
+        registrations = await db.scalar(select(func.sum(UserRegistrationRollup.registrations)))
+
+    assert response.json()["status"] == "succeeded"
+    assert registrations == 13
+
+
+async def test_abandoned_job_is_claimed_again(async_client: AsyncClient) -> None:
+    job_id = await submit_statistics_job(async_client)
+    await abandon_job(job_id, attempts=1)
+
+    assert await run_next_job(session_maker=async_session_maker, stale_after=60)
+
+    response = await async_client.get(f"/jobs/{job_id}/")
+    assert response.json()["status"] == "succeeded"
+    assert response.json()["attempts"] == 2
+
+
+async def test_running_job_is_not_claimed_again(async_client: AsyncClient) -> None:
+    job_id = await submit_statistics_job(async_client)
+    await abandon_job(job_id, attempts=1)
+
+    assert not await run_next_job(session_maker=async_session_maker, stale_after=600)
+
+
+async def test_abandoned_job_fails_after_max_attempts(async_client: AsyncClient) -> None:
+    job_id = await submit_statistics_job(async_client)
+    await abandon_job(job_id, attempts=3)
+
+    assert not await run_next_job(session_maker=async_session_maker, stale_after=60, max_attempts=3)
+
+    response = await async_client.get(f"/jobs/{job_id}/")
+    assert response.json()["status"] == "failed"
+    assert response.json()["error"] == "Abandoned after 3 attempts"
+
+
+async def test_job_locked_by_another_worker_is_skipped(async_client: AsyncClient) -> None:
+    locked_job_id = await submit_statistics_job(async_client)
+    job_id = await submit_statistics_job(async_client)
+
+    async with async_session_maker() as other_worker:
+        await other_worker.execute(select(Job).where(Job.id == locked_job_id).with_for_update())
+
+        assert await run_next_job(session_maker=async_session_maker, stale_after=60)
+
+    response = await async_client.get(f"/jobs/{locked_job_id}/")
+    assert response.json()["status"] == "pending"
+    response = await async_client.get(f"/jobs/{job_id}/")
+    assert response.json()["status"] == "succeeded"
+
+
+@pytest.mark.parametrize(
+    argnames="data,status_code",
+    argvalues=[
+        ({"kind": "users.unknown"}, 400),
+        ({"kind": "users.purge"}, 422),
+        ({"kind": "users.import", "params": {"users": []}}, 422),
+    ],
+)
+async def test_not_successfully_create_job(
+    async_client: AsyncClient, data: dict[str, object], status_code: int
+) -> None:
+    response = await async_client.post("/jobs/", json=data)
+
+    assert response.status_code == status_code
+
+
+async def test_not_successfully_get_not_exist_job(async_client: AsyncClient) -> None:
+    response = await async_client.get("/jobs/1/")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Job with id: 1 does not exist"}
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from src.users import routers
+from src.users.batching import UserCreateBatcher
+
+
+@pytest.fixture(autouse=True)
+def user_create_batcher(monkeypatch: pytest.MonkeyPatch) -> UserCreateBatcher:
+    batcher = UserCreateBatcher(window=0.05, max_size=100)
+    monkeypatch.setattr(routers, "user_create_batcher", batcher)
+    return batcher
+
+
+async def test_concurrent_creates_are_batched(async_client: AsyncClient) -> None:
+    await async_client.post("/users/", json={"username": "taken", "email": "taken@example.com"})
+    data = [
+        {"username": "user1", "email": "user1@example.com"},
+        {"username": "user2", "email": "user2@example.com"},
+        {"username": "user1", "email": "other@example.com"},
+        {"username": "user3", "email": "taken@example.com"},
+    ]
+
+    responses = await asyncio.gather(
+        *(async_client.post("/users/", json=user_data) for user_data in data)
+    )
+
+    first, second = sorted((responses[0], responses[2]), key=lambda response: response.status_code)
+
+    assert (first.status_code, second.status_code) == (201, 400)
+    assert first.json()["username"] == "user1"
+    assert first.headers["ETag"] == '"1"'
+    assert second.json() == {"detail": "User with username: user1 already exists"}
+    assert responses[1].status_code == 201
+    assert responses[3].status_code == 400
+    assert responses[3].json() == {"detail": "User with email: taken@example.com already exists"}
+
+
+async def test_batched_creates_are_counted_in_statistics(async_client: AsyncClient) -> None:
+    await asyncio.gather(
+        *(
+            async_client.post(
+                "/users/", json={"username": f"user{index}", "email": f"user{index}@example.com"}
+            )
+            for index in range(5)
+        )
+    )
+
+    response = await async_client.get("/users/statistics/")
+
+    assert response.json()["count_users_registered_seven_days_ago"] == 5
+
+
+async def test_full_batch_is_flushed_before_the_window(
+    async_client: AsyncClient, user_create_batcher: UserCreateBatcher
+) -> None:
+    user_create_batcher.window = 60
+    user_create_batcher.max_size = 2
+
+    responses = await asyncio.wait_for(
+        asyncio.gather(
+            *(
+                async_client.post(
+                    "/users/",
+                    json={"username": f"user{index}", "email": f"user{index}@example.com"},
+                )
+                for index in range(2)
+            )
+        ),
+        timeout=5,
+    )
+
+    assert [response.status_code for response in responses] == [201, 201]
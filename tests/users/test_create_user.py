@@ -52,3 +52,28 @@ async def test_not_successfully_create_user_with_no_valid_inputs(
     response = await async_client.post("/users/", json=data)
 
     assert response.status_code == 422
+
+
+async def test_retried_create_with_idempotency_key_is_replayed(async_client: AsyncClient) -> None:
+    data = {"username": "retried_user", "email": "retried_user@example.com"}
+    headers = {"Idempotency-Key": "retried-user-key"}
+    response = await async_client.post("/users/", json=data, headers=headers)
+    retry = await async_client.post("/users/", json=data, headers=headers)
+
+    assert response.status_code == retry.status_code == 201
+    assert retry.json() == response.json()
+    assert retry.headers["ETag"] == response.headers["ETag"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert (await async_client.get("/users/?accuracy=exact")).headers["X-Total-Count"] == "1"
+
+
+async def test_idempotency_key_reused_with_different_body(async_client: AsyncClient) -> None:
+    headers = {"Idempotency-Key": "reused-key"}
+    await async_client.post(
+        "/users/", json={"username": "user1", "email": "user1@example.com"}, headers=headers
+    )
+    response = await async_client.post(
+        "/users/", json={"username": "user2", "email": "user2@example.com"}, headers=headers
+    )
+
+    assert response.status_code == 422
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, insert, update
+
+from src.users.models import User
+from tests.conftest import async_session_maker
+
+
+async def test_registration_series_by_day(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    start = datetime.now() - timedelta(days=10)
+    response = await async_client.get(
+        "/users/registrations/", params={"start": start.isoformat(), "interval": "day"}
+    )
+    json_response_data = response.json()
+    counts = [bucket["count"] for bucket in json_response_data]
+
+    assert response.status_code == 200
+    assert len(json_response_data) == 11
+    assert sum(counts) == 25
+    assert counts[0] == 5
+    assert counts[7] == 7
+    assert counts[-1] == 13
+
+
+async def test_registration_series_follows_created_and_deleted_users(
+    async_client: AsyncClient,
+) -> None:
+    start = datetime.now() - timedelta(hours=1)
+    response = await async_client.post("/users/", json={"username": "user", "email": "u@a.com"})
+    user_id = response.json()["id"]
+    await async_client.post("/users/", json={"username": "user2", "email": "u2@a.com"})
+    await async_client.delete(f"/users/{user_id}/")
+
+    response = await async_client.get(
+        "/users/registrations/", params={"start": start.isoformat(), "interval": "hour"}
+    )
+
+    assert response.status_code == 200
+    assert sum(bucket["count"] for bucket in response.json()) == 1
+
+
+@pytest.mark.parametrize(
+    argnames="params",
+    argvalues=[
+        {"start": "2024-01-02T00:00:00", "end": "2024-01-01T00:00:00"},
+        {"start": "2000-01-01T00:00:00", "end": "2024-01-01T00:00:00", "interval": "hour"},
+    ],
+)
+async def test_not_successfully_registration_series(
+    async_client: AsyncClient, params: dict[str, str]
+) -> None:
+    response = await async_client.get("/users/registrations/", params=params)
+
+    assert response.status_code == 400
+
+
+async def test_registration_series_invalid_interval(async_client: AsyncClient) -> None:
+    response = await async_client.get(
+        "/users/registrations/", params={"start": "2024-01-01T00:00:00", "interval": "month"}
+    )
+
+    assert response.status_code == 422
+
+
+async def test_registration_series_follows_writes_outside_of_the_orm(
+    async_client: AsyncClient,
+) -> None:
+    start = datetime.now() - timedelta(days=3, hours=1)
+    async with async_session_maker() as session:
+        await session.execute(
+            insert(User),
+            [{"username": f"user{index}", "email": f"user{index}@a.com"} for index in range(3)],
+        )
+        await session.execute(
+            update(User)
+            .where(User.username == "user0")
+            .values(registration=datetime.now() - timedelta(days=3))
+        )
+        await session.execute(delete(User).where(User.username == "user1"))
+        await session.commit()
+
+    response = await async_client.get(
+        "/users/registrations/", params={"start": start.isoformat(), "interval": "day"}
+    )
+    counts = [bucket["count"] for bucket in response.json()]
+
+    assert counts[0] + counts[1] == 1
+    assert counts[-1] == 1
@@ -0,0 +1,88 @@
+from httpx import AsyncClient
+
+from src.users import services
+from src.users.models import User
+from src.utils import get_random_lower_string
+from tests.conftest import async_session_maker
+
+
+def make_user() -> User:
+    return User(
+        username=get_random_lower_string(), email=f"{get_random_lower_string()}@example.com"
+    )
+
+
+async def test_user_changes(async_client: AsyncClient, create_list_users: tuple[User, ...]) -> None:
+    response = await async_client.get("/users/changes/?limit=10")
+    json_response_data = response.json()
+
+    assert response.status_code == 200
+    assert len(json_response_data["changes"]) == 10
+    assert json_response_data["next_cursor"] == json_response_data["changes"][-1]["seq"]
+
+    response = await async_client.get(f"/users/changes/?since={json_response_data['next_cursor']}")
+
+    assert len(response.json()["changes"]) == 15
+
+
+async def test_user_changes_follow_updates_and_deletes(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    response = await async_client.get("/users/changes/?limit=1000")
+    cursor = response.json()["next_cursor"]
+    updated_user, deleted_user = create_list_users[0], create_list_users[1]
+    new_data = {"username": "new_username", "email": "newemail@example.com"}
+    await async_client.put(f"/users/{updated_user.id}/", json=new_data)
+    await async_client.delete(f"/users/{deleted_user.id}/")
+
+    response = await async_client.get(f"/users/changes/?since={cursor}")
+    changes = response.json()["changes"]
+
+    assert [change["operation"] for change in changes] == ["upsert", "delete"]
+    assert changes[0]["user"]["username"] == "new_username"
+    assert changes[1]["user_id"] == deleted_user.id
+    assert changes[1]["user"] is None
+
+
+async def test_user_changes_wait_for_transactions_that_wrote_earlier(
+    async_client: AsyncClient,
+) -> None:
+    async with async_session_maker() as earlier, async_session_maker() as later:
+        earlier_user, later_user = make_user(), make_user()
+        earlier.add(earlier_user)
+        await earlier.flush()
+        later.add(later_user)
+        await later.commit()
+
+        response = await async_client.get("/users/changes/")
+
+        assert response.json()["changes"] == []
+
+        await earlier.commit()
+
+    response = await async_client.get("/users/changes/")
+    changes = response.json()["changes"]
+
+    assert [change["user_id"] for change in changes] == [earlier_user.id, later_user.id]
+
+
+async def test_stream_user_changes(create_list_users: tuple[User, ...]) -> None:
+    polls = 0
+
+    async def is_disconnected() -> bool:
+        nonlocal polls
+        polls += 1
+        return polls > 1
+
+    events = [
+        event
+        async for event in services.stream_user_changes(
+            session_maker=async_session_maker,
+            since=0,
+            is_disconnected=is_disconnected,
+            poll_interval=0,
+        )
+    ]
+
+    assert len([event for event in events if event.startswith("id: ")]) == 25
+    assert events[-1] == ": keep-alive\n\n"
@@ -21,6 +21,33 @@ async def test_users_list(async_client: AsyncClient, create_list_users: tuple[Us
     assert len(json_response_data) == 25
 
 
+async def test_users_list_total_count(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    response = await async_client.get("/users/?page=2&size=10")
+
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "25"
+    assert response.headers["X-Total-Count-Accuracy"] == "exact"
+
+
+async def test_users_list_total_count_is_cached(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    await async_client.get("/users/")
+    await async_client.post("/users/", json={"username": "user", "email": "user@example.com"})
+
+    response = await async_client.get("/users/")
+
+    assert response.headers["X-Total-Count"] == "25"
+    assert response.headers["X-Total-Count-Accuracy"] == "approx"
+
+    response = await async_client.get("/users/?accuracy=exact")
+
+    assert response.headers["X-Total-Count"] == "26"
+    assert response.headers["X-Total-Count-Accuracy"] == "exact"
+
+
 @pytest.mark.parametrize(
     "page, size, expected_count_users",
     [
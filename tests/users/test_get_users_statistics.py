@@ -1,6 +1,7 @@
 import pytest
 from httpx import AsyncClient
 
+from src.users import services
 from src.users.models import User
 
 
@@ -38,9 +39,29 @@ async def test_users_statistics_with_empty_users(async_client: AsyncClient) -> N
         "count_users_registered_seven_days_ago": 0,
         "top_five_users_with_longest_names": [],
         "percent_of_users_with_specific_domain": "0%",
+        "accuracy": "exact",
     }
 
 
+async def test_users_statistics_approx(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    services.approximate_counts.clear()
+    response = await async_client.get("/users/statistics/?domain=gmail.com&accuracy=approx")
+    json_response_data = response.json()
+
+    # The users table has not been analyzed and nothing is cached yet, so users are counted.
+    assert response.status_code == 200
+    assert json_response_data["percent_of_users_with_specific_domain"] == "28.0%"
+    assert json_response_data["accuracy"] == "exact"
+
+    await async_client.post("/users/", json={"username": "user", "email": "user@gmail.com"})
+    response = await async_client.get("/users/statistics/?domain=gmail.com&accuracy=approx")
+
+    assert response.json()["percent_of_users_with_specific_domain"] == "28.0%"
+    assert response.json()["accuracy"] == "approx"
+
+
 async def test_users_statistics_with_empty_users_invalid_domain(async_client: AsyncClient) -> None:
     response = await async_client.get("/users/statistics/?domain=dggg")
     json_response_data = response.json()
@@ -0,0 +1,160 @@
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import NullPool, func, select
+from sqlalchemy.exc import IntegrityError
+
+from src.core.config import settings
+from src.core.db import BaseORM
+from src.core.sharding import shards
+from src.users.models import User, UserDirectoryEntry, user_id_seq
+from src.utils import get_random_lower_string
+from tests.conftest import async_session_maker
+
+pytestmark = pytest.mark.skipif(
+    len(settings.POSTGRES_TEST_SHARD_URIS) < 2,
+    reason="POSTGRES_TEST_SHARD_URIS must list at least two databases",
+)
+
+
+@pytest.fixture(autouse=True)
+async def prepare_shards() -> AsyncGenerator[None, None]:
+    shards.configure(settings.POSTGRES_TEST_SHARD_URIS, poolclass=NullPool)
+    for engine in shards.engines:
+        async with engine.begin() as conn:
+            await conn.run_sync(BaseORM.metadata.create_all)
+    yield
+    for engine in shards.engines:
+        async with engine.begin() as conn:
+            await conn.run_sync(BaseORM.metadata.drop_all)
+    await shards.dispose()
+    shards.configure([])
+
+
+async def create_users(async_client: AsyncClient, count: int) -> list[dict[str, Any]]:
+    users = []
+    for _ in range(count):
+        data = {
+            "username": get_random_lower_string(),
+            "email": f"{get_random_lower_string()}@example.com",
+        }
+        response = await async_client.post("/users/", json=data)
+        assert response.status_code == 201
+        users.append(response.json())
+    return users
+
+
+async def test_users_are_spread_across_shards(async_client: AsyncClient) -> None:
+    users = await create_users(async_client, 20)
+
+    shard_counts: list[int] = []
+    for session_maker in shards.session_makers:
+        async with session_maker() as session:
+            shard_count = await session.execute(select(func.count(User.id)))
+            shard_counts.append(shard_count.scalar_one())
+
+    assert sum(shard_counts) == 20
+    assert all(shard_counts)
+    for user in users:
+        response = await async_client.get(f"/users/{user['id']}/")
+        assert response.json() == user
+
+
+async def test_uniqueness_across_shards(async_client: AsyncClient) -> None:
+    first, second = await create_users(async_client, 2)
+
+    response = await async_client.post(
+        "/users/", json={"username": first["username"], "email": "other@example.com"}
+    )
+    assert response.status_code == 400
+
+    response = await async_client.put(
+        f"/users/{second['id']}/", json={"username": first["username"], "email": second["email"]}
+    )
+    assert response.status_code == 400
+
+    await async_client.delete(f"/users/{first['id']}/")
+    response = await async_client.put(
+        f"/users/{second['id']}/", json={"username": first["username"], "email": second["email"]}
+    )
+    assert response.status_code == 200
+
+
+async def test_get_users_merges_shards(async_client: AsyncClient) -> None:
+    users = await create_users(async_client, 12)
+
+    response = await async_client.get("/users/?page=2&size=5&accuracy=exact")
+
+    assert [user["id"] for user in response.json()] == [user["id"] for user in users[5:10]]
+    assert response.headers["X-Total-Count"] == "12"
+
+
+async def test_statistics_merge_shards(async_client: AsyncClient) -> None:
+    users = await create_users(async_client, 10)
+
+    response = await async_client.get("/users/statistics/?domain=example.com")
+    json_response_data = response.json()
+    longest_usernames = sorted(
+        (user["username"] for user in users), key=lambda username: (-len(username), username)
+    )
+
+    assert json_response_data["count_users_registered_seven_days_ago"] == 10
+    assert json_response_data["top_five_users_with_longest_names"] == longest_usernames[:5]
+    assert json_response_data["percent_of_users_with_specific_domain"] == "100.0%"
+
+
+async def test_change_feed_is_read_per_shard(async_client: AsyncClient) -> None:
+    users = await create_users(async_client, 10)
+
+    response = await async_client.get("/users/changes/")
+
+    assert response.status_code == 400
+
+    user_ids: list[int] = []
+    for shard in range(len(shards.engines)):
+        response = await async_client.get(f"/users/changes/?shard={shard}")
+        assert response.status_code == 200
+        user_ids.extend(change["user_id"] for change in response.json()["changes"])
+
+    assert sorted(user_ids) == sorted(user["id"] for user in users)
+
+    response = await async_client.get(f"/users/changes/?shard={len(shards.engines)}")
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "job_in",
+    [
+        {"kind": "users.import", "params": {"users": [{"username": "user", "email": "u@ex.com"}]}},
+        {"kind": "users.purge", "params": {"domain": "example.com"}},
+    ],
+)
+async def test_bulk_user_jobs_are_rejected(
+    async_client: AsyncClient, job_in: dict[str, Any]
+) -> None:
+    response = await async_client.post("/jobs/", json=job_in)
+
+    assert response.status_code == 400
+
+
+async def test_failed_shard_write_releases_the_directory_entry(async_client: AsyncClient) -> None:
+    async with async_session_maker() as db:
+        user_id = (await db.execute(select(user_id_seq.next_value()))).scalar_one() + 1
+    async with shards.session_makers[shards.shard_for(user_id)]() as session:
+        session.add(User(id=user_id, username="taken_on_shard", email="taken@example.com"))
+        await session.commit()
+    data = {"username": get_random_lower_string(), "email": "new@example.com"}
+
+    with pytest.raises(IntegrityError):
+        await async_client.post("/users/", json=data)
+
+    async with async_session_maker() as db:
+        entry = await db.scalar(
+            select(UserDirectoryEntry).where(UserDirectoryEntry.username == data["username"])
+        )
+    assert entry is None
+    response = await async_client.post("/users/", json=data)
+    assert response.status_code == 201
@@ -43,3 +43,77 @@ async def test_not_successfully_create_user_with_no_valid_inputs(
     response = await async_client.put(f"/users/{user.id}/", json=new_data)
 
     assert response.status_code == 422
+
+
+async def test_successfully_update_user_with_unchanged_username(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    user = create_list_users[0]
+    new_data = {"username": user.username, "email": "newemail@example.com"}
+    response = await async_client.put(f"/users/{user.id}/", json=new_data)
+
+    assert response.status_code == 200
+    assert response.json()["email"] == new_data["email"]
+
+
+async def test_successfully_patch_user(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    user = create_list_users[0]
+    response = await async_client.patch(f"/users/{user.id}/", json={"email": "new@example.com"})
+    json_response_data = UserFromDB.model_validate(response.json())
+
+    assert response.status_code == 200
+    assert json_response_data.username == user.username
+    assert json_response_data.email == "new@example.com"
+    assert json_response_data.version == user.version + 1
+    assert response.headers["ETag"] == f'"{json_response_data.version}"'
+
+
+async def test_not_successfully_patch_user_exists_username(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    user, other_user = create_list_users[0], create_list_users[1]
+    response = await async_client.patch(
+        f"/users/{user.id}/", json={"username": other_user.username}
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {
+        "detail": f"User with username: {other_user.username} already exists"
+    }
+
+
+@pytest.mark.parametrize(argnames="data", argvalues=[{"username": None}, {"email": "user"}])
+async def test_not_successfully_patch_user_with_no_valid_inputs(
+    async_client: AsyncClient, create_list_users: tuple[User, ...], data: dict[str, str | None]
+) -> None:
+    user = create_list_users[0]
+    response = await async_client.patch(f"/users/{user.id}/", json=data)
+
+    assert response.status_code == 422
+
+
+async def test_update_user_with_if_match(
+    async_client: AsyncClient, create_list_users: tuple[User, ...]
+) -> None:
+    user = create_list_users[0]
+    response = await async_client.get(f"/users/{user.id}/")
+    etag = response.headers["ETag"]
+
+    response = await async_client.patch(
+        f"/users/{user.id}/", json={"username": "first_editor"}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 200
+
+    response = await async_client.patch(
+        f"/users/{user.id}/", json={"username": "second_editor"}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 412
+
+    response = await async_client.put(
+        f"/users/{user.id}/",
+        json={"username": "second_editor", "email": "second@example.com"},
+        headers={"If-Match": "invalid"},
+    )
+    assert response.status_code == 400